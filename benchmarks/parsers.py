@@ -0,0 +1,252 @@
+"""
+    @Author: Thorsten liepert <thorsten@liepert.dev>
+    @Date: 18.10.2026
+    @CLicense: MIT
+    @Description: Micro benchmark of the log parsers on synthetic SCUM logs
+
+    Run from the repository root:
+
+        python -m benchmarks.parsers                      compare against the baseline
+        python -m benchmarks.parsers --update-baseline    store the current results
+        python -m benchmarks.parsers --encoding utf-16-le --lines 50000
+
+    Exits with 1 if a parser got slower or needs more memory per line than the
+    stored baseline allows.
+"""
+import argparse
+import codecs
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from modules.logencoding import LogDecoder, detect_encoding
+from modules.logparser import PARSERS
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+ENCODINGS = ["utf-8", "utf-16-le"]
+NAMES = ["didiann", "Punisher", "Bob", "Ärger", "xX_Sniper_Xx", "Zoë", "Mr Nobody", "Kalle"]
+WEAPONS = ["Compound_Bow_C [Projectile]", "BP_Weapon_AK47_C", "1H_Katana_C [Melee]",
+           "BP_Weapon_M1911_C", "Improvised_Rifle_C"]
+BUNKERS = ["A1", "B2", "B3", "C4", "D2", "Z1"]
+# lines of other log types that end up in the same file and have to be skipped
+GAMEPLAY_NOISE = [
+    "[LogMinigame] [LockpickingMinigame_C] User: {name} ({id}, {steamid}). Success: Yes. "
+    "Elapsed time: 2.50. Failed attempts: 0. Target object: Door(ID: 12345). Lock type: Advanced. "
+    "User owner: 12([76561198000000002] Kalle). Location: X={x} Y={y} Z={z}",
+    "[LogTrap] Triggered. User: {name} ({id}, {steamid}). Trap name: Improvised Claymore. "
+    "Owner: Kalle (12, 76561198000000002). Location: X={x} Y={y} Z={z}",
+    "[LogBaseBuilding] [Flag] Overtaken. User: {name} ({id}, {steamid}). FlagId: 7. "
+    "Location: X={x} Y={y} Z={z}",
+]
+
+class LogGenerator:
+    """Generate deterministic log content of every log file type"""
+    rng: random.Random
+    time: datetime
+
+    def __init__(self, seed: int = 1) -> None:
+        self.rng = random.Random(seed)
+        self.time = datetime(2024, 9, 10, 2, 0, 0)
+
+    def _timestamp(self) -> str:
+        self.time += timedelta(seconds=self.rng.randint(0, 5))
+        return self.time.strftime("%Y.%m.%d-%H.%M.%S")
+
+    def _player(self) -> tuple:
+        index = self.rng.randrange(len(NAMES))
+        return NAMES[index], index + 1, 76561198000000000 + index
+
+    def _coordinate(self) -> str:
+        return f"{self.rng.uniform(-900000, 900000):.3f}"
+
+    def _location(self, z: float) -> dict:
+        """a location of the JSON kill payload"""
+        return {"X": float(self._coordinate()), "Y": float(self._coordinate()), "Z": z}
+
+    def login(self) -> str:
+        """a login or logout line, some of them as drone"""
+        name, player_id, steamid = self._player()
+        state = self.rng.choice(["in", "out"])
+        drone = " (as drone)" if self.rng.random() < 0.05 else ""
+        return (f"{self._timestamp()}: '10.0.0.{player_id} {steamid}:{name}({player_id})' "
+                f"logged {state} at: X={self._coordinate()} Y={self._coordinate()} "
+                f"Z={self._coordinate()}{drone}")
+
+    def kill(self) -> str:
+        """a JSON kill line, every second kill is followed by its text line"""
+        killer, victim = self._player(), self._player()
+        payload = {
+            "Killer": {"ServerLocation": self._location(16720.08984375),
+                       "ClientLocation": self._location(16720.08984375),
+                       "IsInGameEvent": False, "ProfileName": killer[0], "UserId": str(killer[2]),
+                       "HasImmortality": False},
+            "Victim": {"ServerLocation": self._location(16720.01953125),
+                       "ClientLocation": self._location(16720.0703125),
+                       "IsInGameEvent": False, "ProfileName": victim[0], "UserId": str(victim[2])},
+            "Weapon": self.rng.choice(WEAPONS),
+            "TimeOfDay": "19:58:06",
+        }
+        timestamp = self._timestamp()
+        line = f"{timestamp}: {json.dumps(payload, ensure_ascii=False)}"
+        if self.rng.random() < 0.5:
+            line += (f"\n{timestamp}: Died: {victim[0]} ({victim[2]}), Killer: {killer[0]} "
+                     f"({killer[2]}) Weapon: {payload['Weapon']} "
+                     "S[KillerLoc : 1, 2, 3 VictimLoc: 4, 5, 6]")
+        return line
+
+    def gameplay(self) -> str:
+        """mostly other gameplay events, one in ten lines a bunker message"""
+        if self.rng.random() < 0.9:
+            name, player_id, steamid = self._player()
+            return f"{self._timestamp()}: " + self.rng.choice(GAMEPLAY_NOISE).format(
+                name=name, id=player_id, steamid=steamid,
+                x=self._coordinate(), y=self._coordinate(), z=self._coordinate())
+        bunker = self.rng.choice(BUNKERS)
+        kind = self.rng.randrange(4)
+        prefix = f"{self._timestamp()}: [LogBunkerLock] {bunker} Bunker"
+        position = f"X={self._coordinate()} Y={self._coordinate()} Z={self._coordinate()}"
+        if kind == 0:
+            return f"{prefix} is Active. Activated 00h 12m 05s ago. {position}"
+        if kind == 1:
+            return (f"{prefix} is Locked. Locked 01h 00m 00s ago, "
+                    f"next Activation in 25h 47m 38s. {position}")
+        if kind == 2:
+            return f"{prefix} Activated 17h 35m 35s ago"
+        return f"{prefix} Deactivated"
+
+    def famepoints(self) -> str:
+        """a fame points line"""
+        name, _, steamid = self._player()
+        points = self.rng.uniform(0, 5000)
+        return f"Player {name}({steamid}) has {points:.2f} famepoints"
+
+    def admin(self) -> str:
+        """an admin command"""
+        name, player_id, steamid = self._player()
+        command = self.rng.choice(["SpawnItem BP_Weapon_AK47 1", "Teleport 0 0 0",
+                                   "SetFamePoints 1000", "Announce 'Restart in 5 minutes'"])
+        return f"{self._timestamp()}: '{steamid}:{name}({player_id})' Command: '{command}'"
+
+    def content(self, log_type: str, lines: int, encoding: str) -> bytes:
+        """return a log file of log_type with about lines lines as written by the server"""
+        make_line = getattr(self, log_type)
+        text = "Game version: 0.9.604.87396\n" + \
+               "\n".join(make_line() for _ in range(lines)) + "\n"
+        if encoding == "utf-16-le":
+            # the server writes UTF-16 little endian with BOM
+            return codecs.BOM_UTF16_LE + text.encode(encoding)
+        return text.encode(encoding)
+
+def _to_utf8(raw: bytes) -> bytes:
+    """convert the file content like the log sources do"""
+    return LogDecoder(detect_encoding(raw)).to_utf8(raw)
+
+def _parse(log_type: str, raw: bytes) -> list:
+    return list(PARSERS[log_type]().parse_many(_to_utf8(raw)))
+
+def measure(log_type: str, raw: bytes, repeat: int) -> dict:
+    """return throughput and memory use of parsing raw"""
+    lines = _to_utf8(raw).count(b"\n")
+    best = None
+    # like timeit, keep the garbage collector from adding noise to the timing
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            events = _parse(log_type, raw)
+            duration = time.perf_counter() - start
+            best = duration if best is None else min(best, duration)
+            del events
+    finally:
+        gc.enable()
+
+    # memory is measured in a separate run, tracing slows it down.
+    # live blocks are the memory blocks still allocated after the parse,
+    # mostly the events. Temporary objects only show up in the peak
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    events = _parse(log_type, raw)
+    blocks = sys.getallocatedblocks() - blocks
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "lines": lines,
+        "events": len(events),
+        "lines_per_second": round(lines / best),
+        "live_blocks_per_line": round(blocks / lines, 2),
+        "peak_bytes_per_line": round(peak / lines, 1),
+    }
+
+def check(results: dict, baseline: dict, tolerance: float) -> list:
+    """return the regressions of results compared to baseline"""
+    failures = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key]
+        if result["events"] != expected["events"]:
+            failures.append(f"{key}: {result['events']} events, baseline {expected['events']}")
+        if result["lines_per_second"] < expected["lines_per_second"] * (1 - tolerance):
+            failures.append(f"{key}: {result['lines_per_second']} lines/s, "
+                            f"baseline {expected['lines_per_second']}")
+        for field in ["live_blocks_per_line", "peak_bytes_per_line"]:
+            if result[field] > expected[field] * (1 + tolerance) + 0.5:
+                failures.append(f"{key}: {field} {result[field]}, baseline {expected[field]}")
+    return failures
+
+def main() -> int:
+    """run the benchmarks and compare them against the baseline"""
+    arguments = argparse.ArgumentParser(description="Benchmark the SCUM log parsers")
+    arguments.add_argument("--lines", type=int, default=20000, help="lines per log file")
+    arguments.add_argument("--repeat", type=int, default=5,
+                           help="runs per parser, the fastest counts")
+    arguments.add_argument("--encoding", choices=ENCODINGS, action="append",
+                           help="file encoding, may be given more than once (default: all)")
+    arguments.add_argument("--parser", choices=sorted(PARSERS), action="append",
+                           help="log type, may be given more than once (default: all)")
+    arguments.add_argument("--tolerance", type=float, default=0.3,
+                           help="allowed relative regression against the baseline")
+    arguments.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON file")
+    arguments.add_argument("--update-baseline", action="store_true",
+                           help="store the results as new baseline instead of comparing")
+    args = arguments.parse_args()
+
+    results = {}
+    for log_type in args.parser or sorted(PARSERS):
+        for encoding in args.encoding or ENCODINGS:
+            raw = LogGenerator().content(log_type, args.lines, encoding)
+            key = f"{PARSERS[log_type].__name__}/{encoding}/{args.lines}"
+            results[key] = measure(log_type, raw, args.repeat)
+            result = results[key]
+            print(f"{key:40} {result['lines_per_second']:>10} lines/s "
+                  f"{result['live_blocks_per_line']:>7} live blocks/line "
+                  f"{result['peak_bytes_per_line']:>9} peak bytes/line")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as fp:
+            json.dump(baseline, fp, indent=2, sort_keys=True)
+            fp.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    failures = check(results, baseline, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    missing = [key for key in results if key not in baseline]
+    if missing:
+        print(f"No baseline for {', '.join(missing)}, run with --update-baseline")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,9 +9,11 @@
 # pylint: disable=global-statement, too-many-branches, too-many-lines, import-error
 import os
 import sys
+import sqlite3
 import random
 import traceback
 import gettext
+import dataclasses
 
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
@@ -25,8 +27,11 @@ from dotenv import load_dotenv
 # sys.path.append('./')
 from modules.datamanager import ScumLogDataManager
 from modules.logparser import LoginParser, KillParser, BunkerParser, FamepointParser, \
-    AdminParser
+    AdminParser, ParserPool, get_parser
 from modules.sftploader import ScumSFTPLogParser
+from modules.localloader import ScumLocalLogParser
+from modules.ftploader import ScumFtpLogparser
+from modules.logsource import LogSource
 from modules.output import Output
 from modules.configmanager import ConfigManager
 # pylint: enable=wrong-import-position
@@ -57,7 +62,15 @@ intents.message_content = True
 intents.members = True
 
 client = commands.Bot(command_prefix="!",intents=intents)
-lp: None
+# state of the bot, reassigned by on_ready and the loop
+# pylint: disable=invalid-name
+backfill_pending: bool = False
+lp: LogSource = None
+parser_pool: ParserPool = None
+# set up by main()
+config: ConfigManager = None
+_ = gettext.gettext
+# pylint: enable=invalid-name
 
 logging = Output()
 
@@ -66,6 +79,8 @@ async def on_ready():
     """Function is called when bot is ready"""
     global lp
     global heartbeat
+    global backfill_pending
+    global parser_pool
     guild = None
     for guild in client.guilds:
         if config.guild in (guild.name, str(guild.id)):
@@ -83,14 +98,45 @@ async def on_ready():
         #    _('{name}(id: {id})\n').format(name=guild.name, id=guild.id) +
         #    _('Starting log parser.')
         # )
-    #call database manager to initialize db
-    db = ScumLogDataManager(config.database_file)
-
-    # Open SFTP connection to the game server
-    lp = ScumSFTPLogParser(server=config.sftp_server, port=config.sftp_port,
-                           passwd=config.sftp_password, user=config.sftp_user,
-                           logdirectoy=config.log_directory, database=config.database_file,
-                           debug_callback=None)
+    # the database manager is opened once by the config and shared
+    db = config.datamanager
+
+    # on_ready is called again after every reconnect of the gateway, the log
+    # source, the parse pool and the backfill are only set up the first time
+    if lp is None:
+        if config.log_source == "local":
+            # Bot runs on the game server and reads the log files directly
+            lp = ScumLocalLogParser(logdirectoy=config.log_directory,
+                                    database=config.ingest_datamanager,
+                                    debug_callback=None, tail_mode=config.log_tail_mode)
+        elif config.log_source == "ftp":
+            # Hoster only offers FTP access to the log files
+            lp = ScumFtpLogparser(server=config.ftp_server, port=config.ftp_port,
+                                  passwd=config.ftp_password, user=config.ftp_user,
+                                  logdirectoy=config.log_directory,
+                                  database=config.ingest_datamanager,
+                                  debug_callback=None, tail_mode=config.log_tail_mode,
+                                  connect_timeout=config.sftp_connect_timeout,
+                                  max_backoff=config.sftp_max_backoff)
+        else:
+            # Open SFTP connection to the game server
+            lp = ScumSFTPLogParser(server=config.sftp_server, port=config.sftp_port,
+                                   passwd=config.sftp_password, user=config.sftp_user,
+                                   logdirectoy=config.log_directory,
+                                   database=config.ingest_datamanager,
+                                   debug_callback=None, tail_mode=config.log_tail_mode,
+                                   max_workers=config.sftp_workers,
+                                   max_channels=config.sftp_max_channels,
+                                   connect_timeout=config.sftp_connect_timeout,
+                                   keepalive_interval=config.sftp_keepalive_interval,
+                                   max_backoff=config.sftp_max_backoff)
+
+        # Catch up on missed log files on the first loop run
+        backfill_pending = config.log_backfill
+
+        # Large backfills are parsed in worker processes
+        parser_pool = ParserPool(max_workers=config.parse_workers,
+                                 threshold=config.parse_pool_threshold)
 
     # Inital load of guild members
     await load_guild_members(db)
@@ -125,9 +171,6 @@ def _convert_time(in_sec: int) -> str:
 def _get_date_for_age(in_sec: int) -> datetime:
     return datetime.today() - timedelta(days=in_sec)
 
-def _get_timestamp(string):
-    return datetime.strptime(string, "%Y.%m.%d-%H.%M.%S").timestamp()
-
 async def _reply(context, msg) -> None:
     if len(msg) > MAX_MESSAGE_LENGTH:
         chunks = []
@@ -172,7 +215,7 @@ def _check_guild_roles(guild_roles, role) -> bool:
     return retval
 
 def _check_user_bot_role(name: str, bot_role: str, super_admin: bool = False):
-    db = ScumLogDataManager(config.database_file)
+    db = config.datamanager
     user = db.get_guild_member(name)
     user_ok = False
 
@@ -209,44 +252,37 @@ async def send_debug_message(message):
     channel = client.get_channel(int(config.debug_channel))
     await channel.send(message)
 
-async def handle_login(msgs, file, dbconnection):
-    """parse messages from login log files"""
-    channel = client.get_channel(int(config.log_feed_channel))
-    p = LoginParser()
-    for m in msgs[file]:
-        if not isinstance(m,set):
-            for mm in str.split(m,"\n"):
-                msg = p.parse(mm)
-                if msg and dbconnection.check_message_send(msg["hash"]):
-                    player_data = dbconnection.get_player_status(msg["username"])
-                    if len(player_data) == 0:
-                        player_data.append({'drone': False})
-                    if not msg['drone'] and not player_data[0]['drone']:
-                    # pylint: disable=line-too-long
-                        if msg['state'] == "in":
-                            log_msg = _("Player: {name}, logged in ").format(name=msg['username'])
-                        else:
-                            log_msg = _("Player: {name}, logged out ").format(name=msg['username'])
-                        msg_str = log_msg
-                        msg_str += f"@ [X={msg['coordinates']['x']} "
-                        msg_str += f"Y={msg['coordinates']['y']} Z={msg['coordinates']['z']}]"
-                        msg_str += f"(https://scum-map.com/en/map/place/{msg['coordinates']['x']}"
-                        msg_str += f",{msg['coordinates']['y']},3)"
-
-                        if config.config["publish_login"] and \
-                            (datetime.now().timestamp() - _get_timestamp(msg['timestamp']) < 600):
-                            await channel.send(msg_str)
-
-                if msg and dbconnection.check_message_send(msg["hash"]):
-                    if not msg['drone'] and player_data[0]['drone']:
-                        msg['drone'] = True
-                    dbconnection.store_message_send(msg["hash"])
-                    dbconnection.update_player(msg)
-                    # pylint: enable=line-too-long
-
-async def handle_kills(msgs, file, dbconnection):
+async def handle_login(events, dbconnection, outbox=None):
+    """handle events parsed from login log files"""
+    for msg in events:
+        if dbconnection.check_message_send(msg.hash):
+            player_data = dbconnection.get_player_status(msg.username)
+            if len(player_data) == 0:
+                player_data.append({'drone': False})
+            if not msg.drone and not player_data[0]['drone']:
+            # pylint: disable=line-too-long
+                if msg.state == "in":
+                    log_msg = _("Player: {name}, logged in ").format(name=msg.username)
+                else:
+                    log_msg = _("Player: {name}, logged out ").format(name=msg.username)
+                msg_str = log_msg
+                msg_str += f"@ [X={msg.x} "
+                msg_str += f"Y={msg.y} Z={msg.z}]"
+                msg_str += f"(https://scum-map.com/en/map/place/{msg.x}"
+                msg_str += f",{msg.y},3)"
+
+                if config.config["publish_login"] and outbox is not None and \
+                    (datetime.now().timestamp() - msg.epoch < 600):
+                    outbox.append(msg_str)
+
+            if not msg.drone and player_data[0]['drone']:
+                msg = dataclasses.replace(msg, drone=True)
+            dbconnection.store_message_send(msg.hash)
+            dbconnection.update_player(msg)
+            # pylint: enable=line-too-long
+
+async def handle_kills(events, dbconnection, outbox=None):
     """function to construct and send kill messages"""
-    channel = client.get_channel(int(config.log_feed_channel))
     player_insults = [
         _('bad boy'),
         _('savage'),
@@ -256,96 +292,79 @@ async def handle_kills(msgs, file, dbconnection):
     ]
 
     player_insult = random.choice(player_insults)
-    p = KillParser()
-    for m in msgs[file]:
-        if not isinstance(m,set):
-            for mm in str.split(m,"\n"):
-                msg = p.parse(mm)
-                if msg and dbconnection.check_message_send(msg["hash"]):
-                    if msg["event"]["Weapon"] in WEAPON_LOOKUP:
-                        weapon = WEAPON_LOOKUP[[msg["event"]["Weapon"]]]
-                    else:
-                        weapon = msg["event"]["Weapon"]
-                    # pylint: disable=line-too-long
-                    msg_str = _("Player {killer} ").format(killer=msg['event']['Killer']['ProfileName'])
-                    msg_str += _("was a {playerinsult} ").format(playerinsult=player_insult)
-                    msg_str += _("and killed {victim} ").format(victim=msg['event']['Victim']['ProfileName'])
-                    msg_str += _("with a {weapon}.").format(weapon=weapon)
-                    # pylint: enable=line-too-long
-                    if config.config["publish_kills"]:
-                        await channel.send(msg_str)
-                    dbconnection.store_message_send(msg["hash"])
-
-async def handle_bunkers(msgs, file, dbconnection):
+    for msg in events:
+        if dbconnection.check_message_send(msg.hash):
+            details = msg.details()
+            if details.weapon in WEAPON_LOOKUP:
+                weapon = WEAPON_LOOKUP[details.weapon]
+            else:
+                weapon = details.weapon
+            # pylint: disable=line-too-long
+            msg_str = _("Player {killer} ").format(killer=details.killer)
+            msg_str += _("was a {playerinsult} ").format(playerinsult=player_insult)
+            msg_str += _("and killed {victim} ").format(victim=details.victim)
+            msg_str += _("with a {weapon}.").format(weapon=weapon)
+            # pylint: enable=line-too-long
+            if config.config["publish_kills"] and outbox is not None:
+                outbox.append(msg_str)
+            dbconnection.store_message_send(msg.hash)
+
+async def handle_bunkers(events, dbconnection, outbox=None):
     """handle bunker events"""
-    channel = client.get_channel(int(config.log_feed_channel))
-    p = BunkerParser()
-    for m in msgs[file]:
-        if not isinstance(m,set):
-            for mm in str.split(m,"\n"):
-                msg = p.parse(mm)
-                if msg and dbconnection.check_message_send(msg["hash"]):
-                    # Bunker activaed
-
-                    bunker_data = dbconnection.get_active_bunkers(msg['name'])
-                    if len(bunker_data) == 0:
-                        bunker_data.append({"active": 0})
-
-                    if msg["active"] and bunker_data[0]['active'] == 0:
-                        msg_str = _("Bunker {name} was activated. ").format(name=msg['name'])
-                        if len(msg["coordinates"]) != 0:
-                            msg_str += f"Coordinates @ [X={msg['coordinates']['x']} "
-                            msg_str += f"Y={msg['coordinates']['y']} "
-                            msg_str += f"Z={msg['coordinates']['z']}]"
-                            msg_str += "(https://scum-map.com/en/map/place/"
-                            msg_str += f"{msg['coordinates']['x']}"
-                            msg_str += f",{msg['coordinates']['y']},3)"
-                        elif 'coordinates' in bunker_data[0]:
-                            msg_str += f"Coordinates @ [X={bunker_data[0]['coordinates']['x']} "
-                            msg_str += f"Y={bunker_data[0]['coordinates']['y']} "
-                            msg_str += f"Z={bunker_data[0]['coordinates']['z']}]"
-                            msg_str += "(https://scum-map.com/en/map/place/"
-                            msg_str += f"{bunker_data[0]['coordinates']['x']}"
-                            msg_str += f",{bunker_data[0]['coordinates']['y']},3)"
-                        else:
-                            msg_str += _("Bunker coordinates unkown, ")
-                            msg_str += _("it wasnt't discovered previously.")
-                        if config.config["publish_bunkers"]:
-                            await channel.send(msg_str)
-                    dbconnection.update_bunker_status(msg)
-                    dbconnection.store_message_send(msg["hash"])
-
-async def handle_fame(msgs, file, dbconnection):
+    for msg in events:
+        if dbconnection.check_message_send(msg.hash):
+            # Bunker activaed
+
+            bunker_data = dbconnection.get_active_bunkers(msg.name)
+            if len(bunker_data) == 0:
+                bunker_data.append({"active": 0})
+
+            if msg.active and bunker_data[0]['active'] == 0:
+                msg_str = _("Bunker {name} was activated. ").format(name=msg.name)
+                if msg.has_coordinates():
+                    msg_str += f"Coordinates @ [X={msg.x} "
+                    msg_str += f"Y={msg.y} "
+                    msg_str += f"Z={msg.z}]"
+                    msg_str += "(https://scum-map.com/en/map/place/"
+                    msg_str += f"{msg.x}"
+                    msg_str += f",{msg.y},3)"
+                elif 'coordinates' in bunker_data[0]:
+                    msg_str += f"Coordinates @ [X={bunker_data[0]['coordinates']['x']} "
+                    msg_str += f"Y={bunker_data[0]['coordinates']['y']} "
+                    msg_str += f"Z={bunker_data[0]['coordinates']['z']}]"
+                    msg_str += "(https://scum-map.com/en/map/place/"
+                    msg_str += f"{bunker_data[0]['coordinates']['x']}"
+                    msg_str += f",{bunker_data[0]['coordinates']['y']},3)"
+                else:
+                    msg_str += _("Bunker coordinates unkown, ")
+                    msg_str += _("it wasnt't discovered previously.")
+                if config.config["publish_bunkers"] and outbox is not None:
+                    outbox.append(msg_str)
+            dbconnection.update_bunker_status(msg)
+            dbconnection.store_message_send(msg.hash)
+
+async def handle_fame(events, dbconnection, _outbox=None):
     """handle fame point events"""
     # channel = client.get_channel(int(config.log_feed_channel))
-    fp = FamepointParser()
-    for m in msgs[file]:
-        if not isinstance(m,set):
-            for mm in str.split(m,"\n"):
-                msg = fp.parse(mm)
-                if msg and dbconnection.check_message_send(msg["hash"]):
-                    logging.debug(f"Player: {msg['name']} has {msg['points']} Points.")
-                    dbconnection.update_fame_points(msg)
-                    dbconnection.store_message_send(msg["hash"])
-
-async def handle_admin_log(msgs, file, dbconnection):
+    for msg in events:
+        if dbconnection.check_message_send(msg.hash):
+            logging.debug(f"Player: {msg.name} has {msg.points} Points.")
+            dbconnection.update_fame_points(msg)
+            dbconnection.store_message_send(msg.hash)
+
+async def handle_admin_log(events, dbconnection, outbox=None):
     """handle admin log events"""
     # channel = client.get_channel(int(config.log_feed_channel))
-    fp = AdminParser()
-    for m in msgs[file]:
-        if not isinstance(m,set):
-            for mm in str.split(m,"\n"):
-                msg = fp.parse(mm)
-                if msg and dbconnection.check_message_send(msg["hash"]):
-                    logging.debug(f"Admin: {msg['name']}: {msg['type']} - {msg['action']}")
-                    dbconnection.store_message_send(msg["hash"])
-                    dbconnection.update_admin_audit(msg)
-                    if config.config["publish_admin_log"]:
-                        channel = client.get_channel(int(config.log_feed_channel))
-                        msg_str = f"{msg['time']} - Admin: "
-                        msg_str += _("{name} invoked ").format(name=msg['name'])
-                        msg_str += f"{msg['type']}: {msg['action']}\n"
-                        await channel.send(msg_str)
+    for msg in events:
+        if dbconnection.check_message_send(msg.hash):
+            logging.debug(f"Admin: {msg.name}: {msg.type} - {msg.action}")
+            dbconnection.store_message_send(msg.hash)
+            dbconnection.update_admin_audit(msg)
+            if config.config["publish_admin_log"] and outbox is not None:
+                msg_str = f"{msg.timestamp} - Admin: "
+                msg_str += _("{name} invoked ").format(name=msg.name)
+                msg_str += f"{msg.type}: {msg.action}\n"
+                outbox.append(msg_str)
 
 async def load_guild_members(db: ScumLogDataManager):
     """load guild members and add new members to database"""
@@ -438,25 +457,95 @@ async def watchdog():
             logging.error("Main loop was dead. Starting main loop.")
             log_parser_loop.start()
 
+LOG_HANDLERS = {
+    LoginParser: handle_login,
+    KillParser: handle_kills,
+    BunkerParser: handle_bunkers,
+    FamepointParser: handle_fame,
+    AdminParser: handle_admin_log,
+}
+
+def _log_content(log_data) -> bytes:
+    """join the UTF-8 content entries of a log file"""
+    return b"\n".join(m for m in log_data if not isinstance(m,set))
+
+async def handle_log_data(msgs, dbconnection, outbox=None):
+    """pass the new content of every log file to its handler, the messages
+    to publish are collected in outbox, nothing is published if it is None"""
+    parsed = []
+    for file_key in msgs:
+        parser = get_parser(file_key)
+        if parser is not None:
+            parsed.append((parser, await parser_pool.parse(parser, _log_content(msgs[file_key]))))
+    # the handlers don't await anything, so the write lock of the ingest
+    # transaction is never held while the commands run
+    for parser, events in parsed:
+        handler = LOG_HANDLERS[type(parser)]
+        for event in events:
+            try:
+                await handler((event,), dbconnection, outbox)
+            except (sqlite3.Error, OSError):
+                # the cycle is rolled back and read again
+                raise
+            except Exception as e: # pylint: disable=broad-exception-caught
+                # a broken event fails the same way on every read, skip it
+                # instead of blocking the events after it
+                logging.error(f"Skipping {type(event).__name__} {event}: {e}")
+                dbconnection.store_message_send(event.hash)
+
+async def publish_log_messages(outbox):
+    """send the messages of a committed ingest cycle to the log feed"""
+    channel = client.get_channel(int(config.log_feed_channel))
+    for msg_str in outbox:
+        await channel.send(msg_str)
+
+async def backfill_log_data(dbconnection) -> bool:
+    """ingest all log files missed while the bot was down without publishing them,
+    return False if not all files could be read"""
+    global heartbeat
+    logging.info("Catching up on log files written while the bot was offline.")
+    backfill = lp.scum_log_backfill()
+    while True:
+        # one transaction per file, reading it moves the offsets forward
+        with dbconnection.unit_of_work():
+            msgs = await anext(backfill, None)
+            if msgs is None:
+                break
+            await handle_log_data(msgs, dbconnection)
+        # a long backfill must not look like a dead loop to the watchdog
+        heartbeat = datetime.now()
+    if not lp.backfill_complete:
+        logging.warning("Backfill incomplete, trying again on the next check.")
+        return False
+    logging.info("Backfill finished.")
+    return True
+
 @tasks.loop(seconds=LOG_CHECK_INTERVAL)
 async def log_parser_loop():
     """Loop to parse logfiles and handle outputs"""
     global heartbeat
-    db = ScumLogDataManager(config.database_file)
+    global backfill_pending
+    # the cycle runs in a transaction of its own connection, writes of the
+    # commands on config.datamanager are committed independently
+    db = config.ingest_datamanager
+    outbox = []
     await client.wait_until_ready()
-    msgs = await lp.scum_log_parse()
-    if len(msgs) > 0:
-        for file_key in msgs:
-            if "login" in file_key:
-                await handle_login(msgs, file_key, db)
-            elif "kill" in file_key and "event" not in file_key:
-                await handle_kills(msgs, file_key, db)
-            elif "gameplay" in file_key:
-                await handle_bunkers(msgs, file_key, db)
-            elif "famepoints" in file_key:
-                await handle_fame(msgs, file_key, db)
-            elif "admin" in file_key:
-                await handle_admin_log(msgs, file_key, db)
+    try:
+        if backfill_pending:
+            backfill_pending = not await backfill_log_data(db)
+        # reading the newest files would move the checkpoints past the rotated
+        # files the backfill still has to catch up on
+        if not backfill_pending:
+            # the new offsets are only stored together with the events
+            with db.unit_of_work():
+                msgs = await lp.scum_log_parse()
+                await handle_log_data(msgs, db, outbox)
+    except BaseException:
+        # the cycle was rolled back, also when restart() cancelled it,
+        # read the same content again next time
+        lp.reload_read_state()
+        raise
+    await publish_log_messages(outbox)
 
     if datetime.now().minute % 10 == 0:
         await load_guild_members(db)
@@ -465,7 +554,6 @@ async def log_parser_loop():
         db.discard_old_logfiles(30*86400)
         db.discard_aged_messages(30*86400)
         db.discard_old_admin_audtis(60*86400)
-    db.close()
     heartbeat = datetime.now()
 
 @log_parser_loop.error
@@ -487,7 +575,7 @@ async def command_debug(ctx, *args):
     """some debug functions"""
     if not config.experimental:
         return
-    db = ScumLogDataManager(config.database_file)
+    db = config.datamanager
     if args[0] == "dump_all":
         await _reply_author(ctx, _("Current configuration"))
         msg_str = ""
@@ -495,6 +583,12 @@ async def command_debug(ctx, *args):
             msg_str += f"{cfg[0]}: {cfg[1]}\n"
         await _reply_author(ctx, msg_str)
 
+        await _reply_author(ctx, _("Database settings"))
+        msg_str = ""
+        for pragma, value in db.get_pragmas().items():
+            msg_str += f"{pragma}: {value}\n"
+        await _reply_author(ctx, msg_str)
+
         await _reply_author(ctx, _("Members stored in DB."))
         members = db.get_guild_member()
         msg_str = ""
@@ -519,7 +613,7 @@ async def command_debug(ctx, *args):
 async def command_member(ctx, *args):
     """ handle command member"""
     # pylint: disable=consider-using-dict-items
-    db = ScumLogDataManager(config.database_file)
+    db = config.datamanager
     msg_str = ""
     if not _check_user_bot_role(ctx.author.name, 'admin', True):
         await ctx.reply(_("You don't have permission to invoke this command."))
@@ -576,7 +670,7 @@ async def command_member(ctx, *args):
 
 async def handle_command_audit(ctx, args):
     """ handle command audit"""
-    db = ScumLogDataManager(config.database_file)
+    db = config.datamanager
     msg_str = ""
     local_timezone = ZoneInfo('Europe/Berlin')
     if len(args) == 0:
@@ -646,7 +740,7 @@ async def command_audit(ctx, *args):
 
 async def handle_command_config(ctx, args):
     """ ** """
-    db = ScumLogDataManager(config.database_file)
+    db = config.datamanager
     if len(args) <= 0:
         msg = "Current config:\n"
         for cfg in config.config.items():
@@ -735,7 +829,7 @@ async def command_lifetime(ctx, player: str = None):
         await ctx.reply(_("You do not have permission to invoke this command."))
         return
 
-    db = ScumLogDataManager(config.database_file)
+    db = config.datamanager
     if player:
         logging.info(f"Get server lifetime for player {player}")
         player_stat = db.get_player_status(player)
@@ -753,7 +847,6 @@ async def command_lifetime(ctx, player: str = None):
             msg_str += _("{name} lives for {lifetime} on this server.\n").format(name=p['name'], lifetime=lifetime)
 
     await _reply(ctx, msg_str)
-    db.close()
     # pylint: enable=line-too-long
 
 @client.command(name='bunkers')
@@ -766,7 +859,7 @@ async def command_bunkers(ctx, bunker: str = None):
         await ctx.reply(_("You do not have permission to invoke this command."))
         return
 
-    db = ScumLogDataManager(config.database_file)
+    db = config.datamanager
     if bunker:
         logging.info(f"Will get data for Bunker {bunker}")
         b = db.get_active_bunkers(bunker)
@@ -802,7 +895,6 @@ async def command_bunkers(ctx, bunker: str = None):
             msg_str = _("No active bunkers found.")
 
     await _reply(ctx, msg_str)
-    db.close()
 
 @client.command(name='online')
 async def player_online(ctx, player: str = None):
@@ -816,7 +908,7 @@ async def player_online(ctx, player: str = None):
 
     local_timezone = ZoneInfo('Europe/Berlin')
     logging.info(f"Get status for player {player}")
-    db = ScumLogDataManager(config.database_file)
+    db = config.datamanager
     if player:
         player_status = db.get_player_status(player)
 
@@ -850,7 +942,6 @@ async def player_online(ctx, player: str = None):
             message = _("No players are online at the moment.")
 
     await _reply(ctx, message)
-    db.close()
     # pylint: enable=line-too-long
 
 # pylint: disable=line-too-long
@@ -866,7 +957,7 @@ async def player_lastseen(ctx, player: str):
 
     local_timezone = ZoneInfo('Europe/Berlin')
     logging.info(f"Get status for player {player}")
-    db = ScumLogDataManager(config.database_file)
+    db = config.datamanager
     player_status = db.get_player_status(player)
 
     if len(player_status) == 0:
@@ -897,7 +988,6 @@ async def player_lastseen(ctx, player: str):
                       .format(player=player, state=state, lastseen=lastseen)
 
     await _reply(ctx, message)
-    db.close()
 
 @client.command(name=HELP_COMMAND)
 async def bot_help(ctx):
@@ -951,12 +1041,26 @@ async def on_command_error(ctx, error):
         logging.error(f'Ignoring exception in command {ctx.command}:')
         traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
 
-## Start the Program
-config = ConfigManager()
-
-localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'locale')
-translate = gettext.translation('messages', localedir, fallback=True, languages=[config.language])
-translate.install()
-_ = translate.gettext
-
-client.run(config.token)
+def main():
+    """Start the Program"""
+    global config
+    global _
+    config = ConfigManager()
+
+    localedir = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'locale')
+    translate = gettext.translation('messages', localedir, fallback=True,
+                                    languages=[config.language])
+    translate.install()
+    _ = translate.gettext
+
+    client.run(config.token)
+    if lp is not None:
+        lp.shutdown()
+    if parser_pool is not None:
+        parser_pool.shutdown()
+    config.ingest_datamanager.close()
+    config.datamanager.close()
+
+# the parser pool spawns workers that import this file again
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@
 """
 import os
 from dotenv import load_dotenv
-from modules.datamanager import ScumLogDataManager
+from modules.datamanager import ScumLogDataManager, DEFAULT_PRAGMAS
 
 class ConfigManager():
     """Managing configuration"""
@@ -18,6 +18,10 @@ class ConfigManager():
     sftp_port: str
     sftp_user: str
     sftp_password: str
+    ftp_server: str
+    ftp_port: str
+    ftp_user: str
+    ftp_password: str
     debug_channel: str
     log_feed_channel: str
     log_directory: str
@@ -31,8 +35,21 @@ class ConfigManager():
     super_admin_user: str
     user_role: str
     language: str
+    log_source: str
+    log_tail_mode: bool
+    log_backfill: bool
+    sftp_workers: int
+    sftp_max_channels: int
+    sftp_connect_timeout: float
+    sftp_keepalive_interval: int
+    sftp_max_backoff: float
+    parse_workers: int
+    parse_pool_threshold: int
+    database_pragmas: dict
 
     config: dict
+    datamanager: ScumLogDataManager
+    ingest_datamanager: ScumLogDataManager
 
 
     _DEFAULT_CONFIG = {
@@ -56,6 +73,9 @@ class ConfigManager():
         "SFTP_HOST",
         "SFTP_PORT",
         "SFTP_USERNAME",
+        "FTP_HOST",
+        "FTP_PORT",
+        "FTP_USERNAME",
         "DEBUG_CHANNEL",
         "SCUM_LOG_FEED_CHANNEL",
         "LOG_DIRECTORY",
@@ -68,7 +88,23 @@ class ConfigManager():
         "BOT_ADMIN_USER",
         "BOT_SUPER_ADMIN_ROLE",
         "BOT_SUPER_ADMIN_USER",
-        "BOT_USER_ROLE"
+        "BOT_USER_ROLE",
+        "LOG_SOURCE",
+        "LOG_TAIL_MODE",
+        "LOG_BACKFILL",
+        "SFTP_WORKERS",
+        "SFTP_MAX_CHANNELS",
+        "SFTP_CONNECT_TIMEOUT",
+        "SFTP_KEEPALIVE_INTERVAL",
+        "SFTP_MAX_BACKOFF",
+        "PARSE_WORKERS",
+        "PARSE_POOL_THRESHOLD",
+        "DATABASE_JOURNAL_MODE",
+        "DATABASE_SYNCHRONOUS",
+        "DATABASE_CACHE_SIZE",
+        "DATABASE_MMAP_SIZE",
+        "DATABASE_TEMP_STORE",
+        "DATABASE_BUSY_TIMEOUT"
     ]
 
 
@@ -81,6 +117,11 @@ class ConfigManager():
         self.sftp_port = os.getenv("SFTP_PORT")
         self.sftp_user = os.getenv("SFTP_USERNAME")
         self.sftp_password = os.getenv("SFTP_PASSWORD")
+        # FTP falls back to the SFTP settings, most hosters use the same account
+        self.ftp_server = os.getenv("FTP_HOST", self.sftp_server)
+        self.ftp_port = os.getenv("FTP_PORT", "21")
+        self.ftp_user = os.getenv("FTP_USERNAME", self.sftp_user)
+        self.ftp_password = os.getenv("FTP_PASSWORD", self.sftp_password)
 
         self.debug_channel = os.getenv("DEBUG_CHANNEL")
         self.log_feed_channel = os.getenv("SCUM_LOG_FEED_CHANNEL")
@@ -91,6 +132,16 @@ class ConfigManager():
         self.experimental = os.getenv("EXPERIMENTAL_ENABLE")
 
         self.language = os.getenv("BOT_LANGUAGE")
+        self.log_source = os.getenv("LOG_SOURCE")
+        self.log_tail_mode = os.getenv("LOG_TAIL_MODE")
+        self.log_backfill = os.getenv("LOG_BACKFILL")
+        self.sftp_workers = os.getenv("SFTP_WORKERS")
+        self.sftp_max_channels = os.getenv("SFTP_MAX_CHANNELS")
+        self.sftp_connect_timeout = os.getenv("SFTP_CONNECT_TIMEOUT")
+        self.sftp_keepalive_interval = os.getenv("SFTP_KEEPALIVE_INTERVAL")
+        self.sftp_max_backoff = os.getenv("SFTP_MAX_BACKOFF")
+        self.parse_workers = os.getenv("PARSE_WORKERS")
+        self.parse_pool_threshold = os.getenv("PARSE_POOL_THRESHOLD")
 
         if os.getenv("BOT_USER_ADMIN_ROLE") is not None:
             self.admin_role = os.getenv("BOT_USER_ADMIN_ROLE")
@@ -136,11 +187,70 @@ class ConfigManager():
         if not self.language:
             self.language = "en"
 
-        self._load_config(self.database_file)
+        if not self.log_source:
+            self.log_source = "sftp"
 
-    def _load_config(self, database_file) -> None:
+        if self.log_tail_mode is None or self.log_tail_mode == "1":
+            self.log_tail_mode = True
+        else:
+            self.log_tail_mode = False
+
+        if self.log_backfill is None or self.log_backfill == "1":
+            self.log_backfill = True
+        else:
+            self.log_backfill = False
+
+        if self.sftp_workers is None:
+            self.sftp_workers = 4
+        else:
+            self.sftp_workers = int(self.sftp_workers)
+
+        if self.sftp_max_channels is None:
+            self.sftp_max_channels = 4
+        else:
+            self.sftp_max_channels = int(self.sftp_max_channels)
+
+        if self.sftp_connect_timeout is None:
+            self.sftp_connect_timeout = 10.0
+        else:
+            self.sftp_connect_timeout = float(self.sftp_connect_timeout)
+
+        if self.sftp_keepalive_interval is None:
+            self.sftp_keepalive_interval = 30
+        else:
+            self.sftp_keepalive_interval = int(self.sftp_keepalive_interval)
+
+        if self.sftp_max_backoff is None:
+            self.sftp_max_backoff = 600.0
+        else:
+            self.sftp_max_backoff = float(self.sftp_max_backoff)
+
+        if self.parse_workers is None:
+            self.parse_workers = 2
+        else:
+            self.parse_workers = int(self.parse_workers)
+
+        if self.parse_pool_threshold is None:
+            self.parse_pool_threshold = 20000
+        else:
+            self.parse_pool_threshold = int(self.parse_pool_threshold)
+
+        # DATABASE_<PRAGMA> overrides the default of a database setting
+        self.database_pragmas = dict(DEFAULT_PRAGMAS)
+        for pragma in DEFAULT_PRAGMAS:
+            value = os.getenv(f"DATABASE_{pragma.upper()}")
+            if value:
+                self.database_pragmas.update({pragma: value})
+
+        # one connection for the commands and one for the log parser loop, the
+        # commands must not end up in the transaction of an ingest cycle
+        self.datamanager = ScumLogDataManager(self.database_file, self.database_pragmas)
+        self.ingest_datamanager = ScumLogDataManager(self.database_file, self.database_pragmas)
+        self._load_config()
+
+    def _load_config(self) -> None:
         init = False
-        db = ScumLogDataManager(database_file)
+        db = self.datamanager
         _config = db.load_config()
         if len(_config) == 0:
             init = True
@@ -6,11 +6,44 @@
 """
 # pylint: disable=line-too-long
 import os
+import re
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 from modules.output import Output
-
-SCHEMA_VERSION = 109
+from modules.logevents import LoginEvent, BunkerEvent, FameEvent, AdminEvent
+
+SCHEMA_VERSION = 115
+
+# Indexes of the columns the bot looks rows up by. player.steamid and
+# bunkers.name are unique, the update methods expect one row per player
+# and bunker. The timestamp indexes serve the discard_* cleanups.
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS player_steamid ON player (steamid)",
+    "CREATE INDEX IF NOT EXISTS player_username ON player (username)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS bunkers_name ON bunkers (name)",
+    "CREATE INDEX IF NOT EXISTS bunkers_active ON bunkers (active)",
+    "CREATE INDEX IF NOT EXISTS guild_members_name ON guild_members (name)",
+    "CREATE INDEX IF NOT EXISTS admin_audit_timestamp ON admin_audit (timestamp)",
+    "CREATE INDEX IF NOT EXISTS message_send_timestamp ON message_send (timestamp)",
+    "CREATE INDEX IF NOT EXISTS log_offsets_timestamp ON log_offsets (timestamp)",
+]
+
+# Applied to the connection before the schema check. WAL lets the commands
+# read while the log parser loop writes, synchronous NORMAL is safe with WAL
+# and only syncs on checkpoints. cache_size is negative KiB.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+PRAGMA_VALUE_REGEX = r'^-?\w+$'
+# All queries use fixed SQL with ? placeholders, so the statement cache of
+# the connection holds every statement of this module prepared once.
+STATEMENT_CACHE_SIZE = 64
 
 class ScumLogDataManager:
     """Manage Database access for bot"""
@@ -18,8 +51,21 @@ class ScumLogDataManager:
     db_file = ""
     logging: Output
 
-    def __init__(self, db_name) -> None:
+    # writes buffered until the unit of work commits, see unit_of_work()
+    _unit_of_work: bool = False
+    _pending_messages: dict
+    _pending_audit: list
+    _pending_fame: dict
+    _pending_offsets: dict
+    _pending_checkpoints: dict
+
+    def __init__(self, db_name, pragmas: dict = None) -> None:
         self.logging = Output(_stderr = False)
+        self._pending_messages = {}
+        self._pending_audit = []
+        self._pending_fame = {}
+        self._pending_offsets = {}
+        self._pending_checkpoints = {}
         self.db_file = db_name
         if not os.path.exists(self.db_file):
             # pylint: disable=unused-variable
@@ -27,9 +73,32 @@ class ScumLogDataManager:
                 pass
             # pylint: enable=unused-variable
 
-        self.db = sqlite3.connect(db_name)
+        self.db = sqlite3.connect(db_name, cached_statements=STATEMENT_CACHE_SIZE)
+        self._set_pragmas(DEFAULT_PRAGMAS | (pragmas or {}))
         self._check_schema()
 
+    def _set_pragmas(self, pragmas: dict) -> None:
+        cursor = self.db.cursor()
+        for pragma, value in pragmas.items():
+            # pragmas can't be bound as parameters, only accept plain values
+            if pragma not in DEFAULT_PRAGMAS or not re.match(PRAGMA_VALUE_REGEX, str(value)):
+                self.logging.error(f"Ignoring invalid database setting {pragma} = {value}")
+                continue
+            result = cursor.execute(f"PRAGMA {pragma} = {value}").fetchone()
+            if pragma == "journal_mode" and str(result[0]).lower() != str(value).lower():
+                # e.g. WAL on a file system without shared memory support
+                self.logging.warning(f"Database journal mode {value} not available, using {result[0]}")
+
+    def get_pragmas(self) -> dict:
+        """return the current values of the database settings"""
+        cursor = self.db.cursor()
+        pragmas = {}
+        for pragma in DEFAULT_PRAGMAS:
+            # some settings have no value, e.g. mmap_size of an in-memory database
+            result = cursor.execute(f"PRAGMA {pragma}").fetchone()
+            pragmas.update({pragma: result[0] if result is not None else None})
+        return pragmas
+
     def _check_schema(self):
         cursor = self.db.cursor()
         cursor.execute("CREATE TABLE IF NOT EXISTS scum_schema (name TEXT, schema_version INTEGER PRIMARY KEY)")
@@ -53,6 +122,8 @@ class ScumLogDataManager:
             return True
 
     def _update_schema(self):
+        # Rows violating the unique indexes have to go before init creates them
+        self._remove_duplicates()
         # Call init to create none existing tables
         self._init_schema()
         # Update existing tables
@@ -81,6 +152,61 @@ class ScumLogDataManager:
             cursor.execute(add_column)
             self.db.commit()
 
+        check_column = "SELECT COUNT(*) AS CNTREC FROM "
+        check_column += "pragma_table_info('log_offsets') WHERE name='tail_hash'"
+        cursor = self.db.cursor()
+        cursor.execute(check_column)
+        result = cursor.fetchone()
+        if result[0] == 0:
+        # update table
+            add_column = "ALTER TABLE log_offsets "
+            add_column += "ADD tail_hash TEXT DEFAULT ''"
+            cursor.execute(add_column)
+            self.db.commit()
+
+        # files are identified by their offset and tail hash now
+        cursor.execute("DROP TABLE IF EXISTS log_hashes")
+        self.db.commit()
+
+        check_column = "SELECT COUNT(*) AS CNTREC FROM "
+        check_column += "pragma_table_info('message_send') WHERE name='hash' AND type='TEXT'"
+        cursor = self.db.cursor()
+        cursor.execute(check_column)
+        result = cursor.fetchone()
+        if result[0] == 1:
+        # message keys were hex SHA-256 strings, the new keys are their first 8 bytes
+            self.logging.info("Converting message_send hashes to 64 bit keys.")
+            cursor.execute("ALTER TABLE message_send RENAME TO message_send_old")
+            cursor.execute("CREATE TABLE message_send (hash INTEGER PRIMARY KEY, timestamp REAL)")
+            rows = cursor.execute("SELECT hash, timestamp FROM message_send_old").fetchall()
+            cursor.executemany("INSERT OR IGNORE INTO message_send (hash, timestamp) VALUES (?, ?)",
+                               [(int.from_bytes(bytes.fromhex(row[0][:16]), "big", signed=True), row[1])
+                                for row in rows])
+            cursor.execute("DROP TABLE message_send_old")
+            self.db.commit()
+
+        # message_send may have been recreated above
+        self._create_indexes()
+
+    def _remove_duplicates(self):
+        """keep only the newest row per player steamid and bunker name"""
+        cursor = self.db.cursor()
+        for table, column in [("player", "steamid"), ("bunkers", "name")]:
+            cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            if cursor.fetchone()[0] == 0:
+                continue
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IS NOT NULL AND id NOT IN \
+                           (SELECT MAX(id) FROM {table} WHERE {column} IS NOT NULL GROUP BY {column})")
+            if cursor.rowcount > 0:
+                self.logging.warning(f"Removed {cursor.rowcount} duplicate rows from table {table}.")
+        self.db.commit()
+
+    def _create_indexes(self):
+        cursor = self.db.cursor()
+        for index in INDEXES:
+            cursor.execute(index)
+        self.db.commit()
+
     def _init_schema(self):
         cursor = self.db.cursor()
         ## Table does not exists so we create out tables
@@ -95,9 +221,12 @@ class ScumLogDataManager:
         cursor.execute("CREATE TABLE IF NOT EXISTS admin_audit (id INTEGER PRIMARY KEY, timestamp INTEGER, \
                        name TEXT, steamid INTEGER, type TEXT, action TEXT)")
 
-        cursor.execute("CREATE TABLE IF NOT EXISTS message_send (hash TEXT PRIMARY KEY, timestamp REAL)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS message_send (hash INTEGER PRIMARY KEY, timestamp REAL)")
 
-        cursor.execute("CREATE TABLE IF NOT EXISTS log_hashes (timestamp REAL, hash TEXT PRIMARY KEY, file TEXT)")
+        cursor.execute("CREATE TABLE IF NOT EXISTS log_offsets (file TEXT PRIMARY KEY, file_offset INTEGER, timestamp REAL, \
+                       tail_hash TEXT DEFAULT '')")
+
+        cursor.execute("CREATE TABLE IF NOT EXISTS log_checkpoints (name TEXT PRIMARY KEY, file TEXT, timestamp REAL)")
 
         cursor.execute("CREATE TABLE IF NOT EXISTS config (config_key TEXT PRIMARY KEY, config_parameter TEXT)")
 
@@ -108,6 +237,8 @@ class ScumLogDataManager:
 
         cursor.execute("CREATE TABLE IF NOT EXISTS scum_schema (name TEXT, schema_version INTEGER PRIMARY KEY)")
 
+        self._create_indexes()
+
         self._update_schema_version()
 
         self.db.commit()
@@ -120,201 +251,225 @@ class ScumLogDataManager:
         cursor.execute(check_column)
         result = cursor.fetchone()
         if result[0] == 0:
-            cursor.execute(f"INSERT INTO scum_schema (name, schema_version) VALUES ('schema', {SCHEMA_VERSION})")
+            cursor.execute("INSERT INTO scum_schema (name, schema_version) VALUES ('schema', ?)", (SCHEMA_VERSION,))
         else:
-            cursor.execute(f"UPDATE scum_schema SET schema_version={SCHEMA_VERSION} WHERE name = 'schema'")
-
-    def _get_timestamp(self, string):
-        return datetime.strptime(string, "%Y.%m.%d-%H.%M.%S").timestamp()
+            cursor.execute("UPDATE scum_schema SET schema_version = ? WHERE name = 'schema'", (SCHEMA_VERSION,))
+
+    @contextmanager
+    def unit_of_work(self):
+        """group all writes into one transaction
+
+        Inside the block sent messages, admin audit entries, fame points,
+        log offsets and checkpoints are buffered and written with executemany
+        when the block ends, everything is committed once. Other writes are
+        executed immediately but not committed. If the block raises, the transaction
+        is rolled back and the buffers are dropped. Nested blocks join the
+        outer unit of work, so does every other write of this manager while
+        the block runs. Writes that must not be rolled back with it need a
+        manager of their own.
+        """
+        if self._unit_of_work:
+            yield self
+            return
+        self._unit_of_work = True
+        try:
+            yield self
+            self._flush()
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            raise
+        finally:
+            self._unit_of_work = False
+            self._clear_pending()
+
+    def _commit(self) -> None:
+        """commit the writes, deferred to the end of a unit of work"""
+        if self._unit_of_work:
+            return
+        try:
+            self._flush()
+        finally:
+            self._clear_pending()
+        self.db.commit()
 
-    def _get_time_delta(self, string):
-        s = string.split(sep=":")
-        retval = int(s[0])*3600 + int(s[1])*60 + int(s[2])
-        return retval
+    def _flush(self) -> None:
+        cursor = self.db.cursor()
+        if self._pending_messages:
+            cursor.executemany("INSERT OR IGNORE INTO message_send (hash, timestamp) VALUES (?, ?)",
+                               self._pending_messages.items())
+        if self._pending_audit:
+            cursor.executemany("INSERT INTO admin_audit (timestamp, steamid, name, type, action) VALUES (?, ?, ?, ?, ?)",
+                               self._pending_audit)
+        if self._pending_fame:
+            cursor.executemany("INSERT INTO fame (steamid, points) VALUES (?, ?) \
+                               ON CONFLICT(steamid) DO UPDATE SET points = excluded.points",
+                               self._pending_fame.items())
+        if self._pending_offsets:
+            cursor.executemany("INSERT OR REPLACE INTO log_offsets (file, file_offset, timestamp, tail_hash) \
+                               VALUES (?, ?, ?, ?)", self._pending_offsets.values())
+        if self._pending_checkpoints:
+            cursor.executemany("INSERT OR REPLACE INTO log_checkpoints (name, file, timestamp) VALUES (?, ?, ?)",
+                               self._pending_checkpoints.values())
+
+    def _clear_pending(self) -> None:
+        self._pending_messages.clear()
+        self._pending_audit.clear()
+        self._pending_fame.clear()
+        self._pending_offsets.clear()
+        self._pending_checkpoints.clear()
 
     def _discard_old_values(self, table, age_secs):
         age_timestamp = datetime.timestamp(datetime.now()) - age_secs
         age_time = datetime.strftime(datetime.fromtimestamp(age_timestamp), "%d.%m.%Y %H:%M:%S")
         self.logging.info(f"Discarding values older than {age_time} from Table {table}")
-        statement = f"DELETE FROM {table} where timestamp < {age_timestamp}"
+        # table names can't be bound, table is always one of the fixed names below
+        statement = f"DELETE FROM {table} WHERE timestamp < ?"
         cursor = self.db.cursor()
-        cursor.execute(statement)
-        self.db.commit()
+        cursor.execute(statement, (age_timestamp,))
+        self._commit()
 
-    def store_message_send(self, message_hash):
+    def store_message_send(self, message_hash: int):
         """store send message in database"""
-        cursor = self.db.cursor()
-        cursor.execute(f"SELECT hash FROM message_send WHERE hash = '{message_hash}'")
-        if len(cursor.fetchall()) > 0:
+        if not self.check_message_send(message_hash):
             self.logging.info ("Hash already stored. Not updating database.")
         else:
-            cursor.execute(f"INSERT INTO message_send (hash, timestamp) VALUES ('{message_hash}', {datetime.timestamp(datetime.now())})")
-            self.db.commit()
+            self._pending_messages.update({message_hash: datetime.timestamp(datetime.now())})
+            self._commit()
 
-    def check_message_send(self, message_hash):
+    def check_message_send(self, message_hash: int):
         """Will check if a messages is already sent.
             Return True if it isn't stored
             Return False if it is already stored in database"""
+        if message_hash in self._pending_messages:
+            return False
         cursor = self.db.cursor()
-        cursor.execute(f"SELECT hash FROM message_send WHERE hash = '{message_hash}'")
+        cursor.execute("SELECT hash FROM message_send WHERE hash = ?", (message_hash,))
+        return cursor.fetchone() is None
 
-        if len(cursor.fetchall()) > 0:
-            hashes = cursor.fetchall()
-            for mhash in hashes:
-                if mhash == message_hash:
-                    return False
-        else:
-            return True
-
-    def update_player(self, player):
+    def update_player(self, player: LoginEvent):
         """update player data in database"""
         cursor = self.db.cursor()
-        cursor.execute(f"SELECT * FROM player WHERE steamid = '{player['steamID']}'")
+        cursor.execute("SELECT * FROM player WHERE steamid = ?", (player.steamid,))
         player_data = cursor.fetchall()
         if len(player_data) > 1:
             self.logging.warning("Multiple entries found with same steamID")
             return False
         elif len(player_data) == 0:
             self.logging.warning("No User with steamID in Database")
-            if player["state"] == "in":
+            if player.state == "in":
                 state = True
-                loggedin_timestamp = self._get_timestamp(player['timestamp'])
+                loggedin_timestamp = player.epoch
                 loggedout_timestamp = 0
             else:
                 state = False
                 loggedin_timestamp = 0
-                loggedout_timestamp = self._get_timestamp(player['timestamp'])
+                loggedout_timestamp = player.epoch
 
-            cursor.execute(f"INSERT INTO player (timestamp, steamid, username, loggedin, coordinates_x, \
+            cursor.execute("INSERT INTO player (timestamp, steamid, username, loggedin, coordinates_x, \
                            coordinates_y, coordinates_z, login_timestamp, logout_timestamp, server_lifetime, drone) \
-                           VALUES ({self._get_timestamp(player['timestamp'])}, {player['steamID']}, '{player['username']}', \
-                           {state}, {player['coordinates']['x']}, {player['coordinates']['y']}, {player['coordinates']['z']}, \
-                           {loggedin_timestamp}, {loggedout_timestamp}, 0, {player['drone']})")
-            self.db.commit()
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                           (player.epoch, player.steamid, player.username, state, player.x, player.y, player.z,
+                            loggedin_timestamp, loggedout_timestamp, player.drone))
+            self._commit()
             return True
         else:
-            if player["state"] == "in":
+            if player.state == "in":
                 state = True
-                loggedin_timestamp = self._get_timestamp(player['timestamp'])
-                cursor.execute(f"UPDATE player SET  \
-                               timestamp = {self._get_timestamp(player['timestamp'])}, \
-                               loggedin = {state}, \
-                               coordinates_x = {player['coordinates']['x']}, \
-                               coordinates_y = {player['coordinates']['y']}, \
-                               coordinates_z = {player['coordinates']['z']}, \
-                               login_timestamp = {loggedin_timestamp}, \
-                               drone = {player['drone']} \
-                               WHERE steamid == '{player['steamID']}'")
+                loggedin_timestamp = player.epoch
+                cursor.execute("UPDATE player SET  \
+                               timestamp = ?, \
+                               loggedin = ?, \
+                               coordinates_x = ?, \
+                               coordinates_y = ?, \
+                               coordinates_z = ?, \
+                               login_timestamp = ?, \
+                               drone = ? \
+                               WHERE steamid == ?",
+                               (player.epoch, state, player.x, player.y, player.z,
+                                loggedin_timestamp, player.drone, player.steamid))
 
             else:
                 state = False
                 login_ts = player_data[0][8]
-                was_drone = player['drone']
-                player['drone'] = False
-                loggedout_timestamp = self._get_timestamp(player['timestamp'])
+                was_drone = player.drone
+                loggedout_timestamp = player.epoch
                 if login_ts > 0 and login_ts < loggedout_timestamp and not was_drone:
                     server_lifetime = loggedout_timestamp - login_ts
                     server_lifetime_all = server_lifetime + player_data[0][10]
                 else:
                     server_lifetime_all = player_data[0][10]
-                cursor.execute(f"UPDATE player SET  \
-                               timestamp = {self._get_timestamp(player['timestamp'])}, \
-                               loggedin = {state}, \
-                               coordinates_x = {player['coordinates']['x']}, \
-                               coordinates_y = {player['coordinates']['y']}, \
-                               coordinates_z ={player['coordinates']['z']}, \
-                               logout_timestamp = {loggedout_timestamp}, \
-                               server_lifetime = {server_lifetime_all}, \
-                               drone = {player['drone']} \
-                               WHERE steamid == '{player['steamID']}'")
-            self.db.commit()
+                cursor.execute("UPDATE player SET  \
+                               timestamp = ?, \
+                               loggedin = ?, \
+                               coordinates_x = ?, \
+                               coordinates_y = ?, \
+                               coordinates_z = ?, \
+                               logout_timestamp = ?, \
+                               server_lifetime = ?, \
+                               drone = False \
+                               WHERE steamid == ?",
+                               (player.epoch, state, player.x, player.y, player.z,
+                                loggedout_timestamp, server_lifetime_all, player.steamid))
+            self._commit()
             return True
 
-    def update_bunker_status(self, bunker):
+    def update_bunker_status(self, bunker: BunkerEvent):
         """update bunker status in database"""
         cursor = self.db.cursor()
-        cursor.execute(f"SELECT * FROM bunkers WHERE name = '{bunker['name']}'")
+        cursor.execute("SELECT * FROM bunkers WHERE name = ?", (bunker.name,))
         bunker_data = cursor.fetchall()
         statement = None
+        params = ()
         if len(bunker_data) == 0:
-            self.logging.info(f"Bunker {bunker['name']} not in Database")
-            if len(bunker["coordinates"]) != 0 and len(bunker["next"]) == 0 and bunker["active"]:
-                statement = "INSERT INTO bunkers (name, timestamp, active, since, next,"
-                statement += "coordinates_x, coordinates_y, coordinates_z) VALUES "
-                statement += f"('{bunker['name']}', {self._get_timestamp(bunker['timestamp'])}, {bunker['active']},"
-                statement += f"self._get_time_delta({bunker['since']['h']}:{bunker['since']['m']}:{bunker['since']['s']}),"
-                statement += "0,"
-                statement += f"{bunker['coordinates']['x']},{bunker['coordinates']['y']},{bunker['coordinates']['z']})"
-            elif len(bunker["next"]) != 0 and not bunker["active"]:
-                statement = "INSERT INTO bunkers (name, timestamp, active, since, next,"
-                statement += "coordinates_x, coordinates_y, coordinates_z) VALUES "
-                statement += f"('{bunker['name']}', {self._get_timestamp(bunker['timestamp'])}, {bunker['active']},"
-                statement += f"{self._get_time_delta(bunker['since']['h']+':'+bunker['since']['m']+':'+bunker['since']['s'])},"
-                statement += f"{self._get_time_delta(bunker['next']['h']+':'+bunker['next']['m']+':'+bunker['next']['s'])},"
-                statement += f"{bunker['coordinates']['x']},{bunker['coordinates']['y']},{bunker['coordinates']['z']})"
-            elif len(bunker["next"]) == 0 and len(bunker["coordinates"]) == 0 and bunker["active"]:
-                statement = "INSERT INTO bunkers (name, timestamp, active, since, next,"
-                statement += "coordinates_x, coordinates_y, coordinates_z) VALUES "
-                statement += f"('{bunker['name']}', {self._get_timestamp(bunker['timestamp'])}, {bunker['active']},"
-                statement += f"{self._get_time_delta(bunker['since']['h']+':'+bunker['since']['m']+':'+bunker['since']['s'])},"
-                statement += "0, 0, 0, 0)"
-
-            elif len(bunker["next"]) == 0 and len(bunker["since"]) == 0 and not bunker["active"]:
-                statement = "INSERT INTO bunkers (name, timestamp, active, since, next,"
-                statement += "coordinates_x, coordinates_y, coordinates_z) VALUES "
-                statement += f"('{bunker['name']}', {self._get_timestamp(bunker['timestamp'])}, {bunker['active']},"
-                statement += "0, 0, 0, 0, 0)"
+            self.logging.info(f"Bunker {bunker.name} not in Database")
+            statement = "INSERT INTO bunkers (name, timestamp, active, since, next,"
+            statement += "coordinates_x, coordinates_y, coordinates_z) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            if bunker.has_coordinates() and bunker.next is None and bunker.active:
+                params = (bunker.name, bunker.epoch, bunker.active, bunker.since, 0,
+                          bunker.x, bunker.y, bunker.z)
+            elif bunker.next is not None and not bunker.active:
+                params = (bunker.name, bunker.epoch, bunker.active, bunker.since, bunker.next,
+                          bunker.x, bunker.y, bunker.z)
+            elif bunker.next is None and not bunker.has_coordinates() and bunker.active:
+                params = (bunker.name, bunker.epoch, bunker.active, bunker.since, 0, 0, 0, 0)
+            elif bunker.next is None and bunker.since is None and not bunker.active:
+                params = (bunker.name, bunker.epoch, bunker.active, 0, 0, 0, 0, 0)
+            else:
+                statement = None
 
         elif len(bunker_data) == 1:
-            self.logging.info(f"Bunker {bunker['name']} in Database")
-            if len(bunker["coordinates"]) > 0 and len(bunker["next"]) == 0 and bunker["active"]: # Active
-                statement = "UPDATE bunkers SET "
-                statement += f"timestamp = {self._get_timestamp(bunker['timestamp'])},"
-                statement += f"active = {bunker['active']},"
-                statement += f"since = {self._get_time_delta(bunker['since']['h']+':'+bunker['since']['m']+':'+bunker['since']['s'])},"
-                statement += f"coordinates_x = {bunker['coordinates']['x']},"
-                statement += f"coordinates_y = {bunker['coordinates']['y']},"
-                statement += f"coordinates_z = {bunker['coordinates']['z']} "
-                statement += f"WHERE name = '{bunker['name']}'"
-            elif len(bunker["next"]) != 0 and not bunker["active"]: # Locked
-                statement = "UPDATE bunkers SET "
-                statement += f"timestamp = {self._get_timestamp(bunker['timestamp'])},"
-                statement += f"active = {bunker['active']},"
-                statement += f"since = {self._get_time_delta(bunker['since']['h']+':'+bunker['since']['m']+':'+bunker['since']['s'])},"
-                statement += f"next = {self._get_time_delta(bunker['next']['h']+':'+bunker['next']['m']+':'+bunker['next']['s'])},"
-                statement += f"coordinates_x = {bunker['coordinates']['x']},"
-                statement += f"coordinates_y = {bunker['coordinates']['y']},"
-                statement += f"coordinates_z = {bunker['coordinates']['z']} "
-                statement += f"WHERE name = '{bunker['name']}'"
-            elif len(bunker["next"]) == 0 and len(bunker["coordinates"]) == 0 and bunker["active"]: # Activated
-                statement = "UPDATE bunkers SET "
-                statement += f"timestamp = {self._get_timestamp(bunker['timestamp'])},"
-                statement += f"active = {bunker['active']},"
-                statement += f"since = {self._get_time_delta(bunker['since']['h']+':'+bunker['since']['m']+':'+bunker['since']['s'])} "
-                statement += f"WHERE name = '{bunker['name']}'"
-            elif len(bunker["next"]) == 0 and len(bunker["since"]) == 0 and not bunker["active"]: # Deactivated
-                statement = "UPDATE bunkers SET "
-                statement += f"timestamp = {self._get_timestamp(bunker['timestamp'])},"
-                statement += f"active = {bunker['active']},"
-                statement += "since = 0,"
-                statement += "next = 0,"
-                statement += "coordinates_x = 0,"
-                statement += "coordinates_y = 0,"
-                statement += "coordinates_z = 0 "
-                statement += f"WHERE name = '{bunker['name']}'"
+            self.logging.info(f"Bunker {bunker.name} in Database")
+            if bunker.has_coordinates() and bunker.next is None and bunker.active: # Active
+                statement = "UPDATE bunkers SET timestamp = ?, active = ?, since = ?, "
+                statement += "coordinates_x = ?, coordinates_y = ?, coordinates_z = ? WHERE name = ?"
+                params = (bunker.epoch, bunker.active, bunker.since,
+                          bunker.x, bunker.y, bunker.z, bunker.name)
+            elif bunker.next is not None and not bunker.active: # Locked
+                statement = "UPDATE bunkers SET timestamp = ?, active = ?, since = ?, next = ?, "
+                statement += "coordinates_x = ?, coordinates_y = ?, coordinates_z = ? WHERE name = ?"
+                params = (bunker.epoch, bunker.active, bunker.since, bunker.next,
+                          bunker.x, bunker.y, bunker.z, bunker.name)
+            elif bunker.next is None and not bunker.has_coordinates() and bunker.active: # Activated
+                statement = "UPDATE bunkers SET timestamp = ?, active = ?, since = ? WHERE name = ?"
+                params = (bunker.epoch, bunker.active, bunker.since, bunker.name)
+            elif bunker.next is None and bunker.since is None and not bunker.active: # Deactivated
+                statement = "UPDATE bunkers SET timestamp = ?, active = ?, since = 0, next = 0, "
+                statement += "coordinates_x = 0, coordinates_y = 0, coordinates_z = 0 WHERE name = ?"
+                params = (bunker.epoch, bunker.active, bunker.name)
         else:
-            self.logging.info(f"Not updateing database more than one bunker found with the same name {bunker['name']}")
+            self.logging.info(f"Not updateing database more than one bunker found with the same name {bunker.name}")
 
         if statement:
-            cursor.execute(''.join(statement))
-            self.db.commit()
+            cursor.execute(statement, params)
+            self._commit()
 
     def get_player_status(self, player_name = None) -> list:
         """get player data from database"""
         ret_val = []
         cursor = self.db.cursor()
         if player_name:
-            cursor.execute(f"SELECT * FROM player WHERE username = '{player_name}'")
+            cursor.execute("SELECT * FROM player WHERE username = ?", (player_name,))
         else:
             cursor.execute("SELECT * FROM player")
         player_data = cursor.fetchall()
@@ -350,7 +505,7 @@ class ScumLogDataManager:
         cursor = self.db.cursor()
 
         if bunker:
-            cursor.execute(f"SELECT * FROM bunkers WHERE name = '{bunker.upper()}'")
+            cursor.execute("SELECT * FROM bunkers WHERE name = ?", (bunker.upper(),))
             bunker_data = cursor.fetchall()
             if len(bunker_data) == 0:
                 retval = []
@@ -422,11 +577,11 @@ class ScumLogDataManager:
         self._discard_old_values("player", age)
 
     def discard_old_logfiles(self, age: int) -> None:
-        """discard old log file hashes from table
+        """discard old log file offsets from table
            Parameters:
             age: int in seconds
         """
-        self._discard_old_values("log_hashes", age)
+        self._discard_old_values("log_offsets", age)
 
 
     def discard_old_admin_audtis(self, age: int) -> None:
@@ -436,30 +591,46 @@ class ScumLogDataManager:
         """
         self._discard_old_values("admin_audit", age)
 
-    def raw(self, query: str) -> list[any]:
-        """raw sql query"""
+    def raw(self, query: str, params: tuple = ()) -> list[any]:
+        """raw sql query, values are bound to the ? placeholders from params"""
         cursor = self.db.cursor()
-        ret = cursor.execute(query)
+        ret = cursor.execute(query, params)
         return ret.fetchall()
 
-    def update_log_file_hash(self, _hash: str, file: str) -> None:
-        """update log file hash in database"""
+    def update_log_file_offset(self, file: str, offset: int, tail_hash: str = "") -> None:
+        """store the byte offset up to which a log file has been read
+           Parameters:
+            tail_hash: hash of the last bytes before offset
+        """
         curr_time = datetime.timestamp(datetime.now())
-        query = f"SELECT hash FROM log_hashes WHERE hash = '{_hash}'"
+        # only the last offset of a file in a unit of work is written
+        self._pending_offsets.update({file: (file, offset, curr_time, tail_hash)})
+        self._commit()
+
+    def get_log_file_offsets(self) -> dict:
+        """get byte offset and tail hash of already read log files"""
+        retval = {}
+        query = "SELECT file, file_offset, tail_hash FROM log_offsets"
         repl = self.raw(query)
-        if len(repl) == 0:
-            query = "INSERT INTO log_hashes (timestamp, hash, file) "
-            query += f"VALUES ({curr_time}, '{_hash}', '{file}')"
-            repl = self.raw(query)
-            self.db.commit()
+        for item in repl:
+            retval.update({item[0]: [item[1], item[2] or ""]})
+
+        return retval
 
-    def get_log_file_hashes(self) -> dict:
-        """get log file hash from database"""
-        retval= {}
-        query = "SELECT * FROM log_hashes"
+    def update_log_checkpoint(self, name: str, file: str) -> None:
+        """store the newest log file read for the log group name"""
+        curr_time = datetime.timestamp(datetime.now())
+        # reading the files doesn't take the write lock inside a unit of work
+        self._pending_checkpoints.update({name: (name, file, curr_time)})
+        self._commit()
+
+    def get_log_checkpoints(self) -> dict:
+        """get the newest log file read for every log group"""
+        retval = {}
+        query = "SELECT name, file FROM log_checkpoints"
         repl = self.raw(query)
         for item in repl:
-            retval.update({item[1]: item[2]})
+            retval.update({item[0]: item[1]})
 
         return retval
 
@@ -473,19 +644,18 @@ class ScumLogDataManager:
         for key in config:
             value = config[key]
             if key not in db_config:
-                query = "INSERT INTO config (config_key, config_parameter) "
-                query += f"VALUES ('{key}', '{value}')"
+                query = "INSERT INTO config (config_parameter, config_key) VALUES (?, ?)"
             else:
                 if db_config[key] != str(value):
-                    query = "UPDATE config SET config_parameter = "
-                    query += f"'{value}' WHERE config_key = '{key}'"
+                    query = "UPDATE config SET config_parameter = ? WHERE config_key = ?"
                 else:
                     # nothing to update
                     query = ""
 
             if query:
-                self.raw(query)
-                self.db.commit()
+                # values are stored as text, load_config converts them back
+                self.raw(query, (str(value), key))
+                self._commit()
 
     def load_config(self) -> dict:
         """Save config in database"""
@@ -502,29 +672,24 @@ class ScumLogDataManager:
                     retval.update({item[0]: False})
         return retval
 
-    def update_admin_audit(self, audit_data: dict) -> None:
+    def update_admin_audit(self, audit_data: AdminEvent) -> None:
         """store data in table admin_audit"""
-        audit_data.update({'action': audit_data['action'].replace("'", "")})
-        audit_timestamp = self._get_timestamp(audit_data["time"])
-        query = "INSERT INTO admin_audit "
-        query += "(timestamp, steamid, name, type, action) "
-        query += f"VALUES ({audit_timestamp}, {audit_data['steamid']}, "
-        query += f"'{audit_data['name']}', '{audit_data['type']}', '{audit_data['action']}'"
-        query += ")"
-
-        self.raw(query)
-        self.db.commit()
+        self._pending_audit.append((audit_data.epoch, audit_data.steamid, audit_data.name,
+                                    audit_data.type, audit_data.action))
+        self._commit()
 
     def get_admin_audit(self, by: str = None, value: str = None) -> list:
         """ get audit data """
         retval = []
+        params = ()
         if by is None and value is None:
             query = "SELECT timestamp, steamid, name, type, action from admin_audit"
         elif by == "age" and value is not None:
             query = "SELECT timestamp, steamid, name, type, "
-            query += f"action from admin_audit where timestamp >= {int(value)}"
+            query += "action from admin_audit where timestamp >= ?"
+            params = (int(value),)
 
-        result = self.raw(query)
+        result = self.raw(query, params)
         for r in result:
             retval.append({
                 "timestamp": r[0],
@@ -536,59 +701,49 @@ class ScumLogDataManager:
 
         return retval
 
-    def update_fame_points(self, _data: dict) -> None:
+    def update_fame_points(self, _data: FameEvent) -> None:
         """update fame points"""
-        query = f"SELECT * from fame where steamid = {_data['steamid']}"
-        sel = self.raw(query)
-        if len(sel) == 0:
-            query = "INSERT INTO fame (steamid, points) VALUES "
-            query += f"({_data['steamid']}, {_data['points']})"
-            self.raw(query)
-        else:
-            query = "UPDATE fame SET "
-            query += f"points = {_data['points']} WHERE "
-            query += f"steamid={_data['steamid']}"
-            self.raw(query)
-
-        self.db.commit()
+        # inserted or updated on commit, the last points of a player win
+        self._pending_fame.update({_data.steamid: _data.points})
+        self._commit()
 
     def get_fame_points(self, name: str) -> dict:
         """ get fame points """
         retval = {}
-        query = f"SELECT steamid from player where name = '{name}'"
-        sel = self.raw(query)
-        if len(sel) == 0:
-            query = f"SELECT * from fame where steamid=={sel['steamid']}"
-            sel_points = self.raw(query)
+        query = "SELECT fame.points FROM fame JOIN player ON player.steamid = fame.steamid "
+        query += "WHERE player.username = ?"
+        sel = self.raw(query, (name,))
+        if len(sel) != 0:
             retval.update({
-                name: sel_points["points"]
+                name: sel[0][0]
             })
         return retval
 
     def update_guild_member(self, _id: int, name: str, guild_role: str, bot_role: str) -> None:
         """ Update guild members"""
-        query = f"SELECT * FROM guild_members WHERE id=={_id}"
-        res = self.raw(query)
+        query = "SELECT * FROM guild_members WHERE id = ?"
+        res = self.raw(query, (_id,))
         if len(res) == 0:
-            query = "INSERT INTO guild_members (id, name, roles, bot_role)"
-            query += f" VALUES ({_id}, '{name}', '{guild_role}', '{bot_role}')"
+            query = "INSERT INTO guild_members (id, name, roles, bot_role) VALUES (?, ?, ?, ?)"
+            params = (_id, name, guild_role, bot_role)
         else:
-            query = "UPDATE guild_members SET"
-            query += f" roles='{guild_role}', bot_role='{bot_role}'"
-            query += f" WHERE id=='{_id}'"
+            query = "UPDATE guild_members SET roles = ?, bot_role = ? WHERE id = ?"
+            params = (guild_role, bot_role, _id)
 
-        self.raw(query)
-        self.db.commit()
+        self.raw(query, params)
+        self._commit()
 
     def get_guild_member(self, name: str = "") -> dict:
         """ get guild members"""
         retval = {}
+        params = ()
         if name != "":
-            query = f"SELECT * FROM guild_members WHERE name=='{name}'"
+            query = "SELECT * FROM guild_members WHERE name = ?"
+            params = (name,)
         else:
             query = "SELECT * FROM guild_members"
 
-        res = self.raw(query)
+        res = self.raw(query, params)
         if len(res) != 0:
             for member in res:
                 retval.update({
@@ -603,7 +758,7 @@ class ScumLogDataManager:
 
     def close(self) -> None:
         """close database connection"""
-        self.db.commit()
+        self._commit()
         self.db.close()
 
 # pylint: enable=line-too-long
@@ -4,58 +4,178 @@
     @CLicense: MIT
     @Description: Get logfiles from ftp server
 """
-import os
-from ftplib import FTP
+import asyncio
+import ftplib
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
-class ScumFtpLogparser:
-    """Class representing a a log parser"""
+from modules.logsource import LogSource, LogClient, ConnectionManager, FileAttributes
+
+# Errors that mean the server is unreachable or the connection broke
+FTP_ERRORS = ftplib.all_errors
+# A 5xx reply to RETR means the file is missing or not readable
+FTP_FILE_ERRORS = (ftplib.error_perm,)
+
+class FTPLogClient(LogClient):
+    """FTP client keeping one control connection open
+
+    ftplib is blocking and a control connection can only run one command
+    at a time, so all calls run one after another in a single thread.
+    """
     ftp_server = ""
     ftp_user = ""
     ftp_password = ""
-    connect_p = None
-    current_log = []
-    current_timestamp = 0
-    logfile = "test.txt"
+    ftp_port = 21
+    connect_timeout: float = 10.0
+    connect_p: ftplib.FTP = None
 
+    _executor: ThreadPoolExecutor
+    _mlsd: bool = True
+    _rest: bool = True
 
-    def __init__(self, server, user, passwd, logfile) -> None:
+    def __init__(self, server, port, user, passwd, connect_timeout: float = 10.0) -> None:
         self.ftp_server = server
         self.ftp_user = user
         self.ftp_password = passwd
-        self.logfile = logfile
-        self.connect_p = FTP(server,user=user,passwd=passwd)
-        self._scum_log_parser_load_timestamp()
-
-    def _scum_log_parser_load_timestamp(self):
-        if os.path.exists("scum_log_parser_ts.txt"):
-            with open("scum_log_parser_ts.txt", "r", encoding="utf-8") as _fp:
-                self.current_timestamp = int(_fp.read())
-        else:
-            self.current_timestamp = 0
-
-    def _scum_log_parser_store_timestamp(self):
-        with open("scum_log_parser_ts.txt", "w", encoding="utf-8") as _fp:
-            _fp.write(str(self.current_timestamp))
-
-    def _scum_log_parser_retrive(self):
+        self.ftp_port = port
+        self.connect_timeout = connect_timeout
+        self._mlsd = True
+        self._rest = True
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ftp")
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> None:
+        self._close()
+        self.connect_p = ftplib.FTP(timeout=self.connect_timeout)
+        self.connect_p.connect(self.ftp_server, int(self.ftp_port))
         self.connect_p.login(user=self.ftp_user, passwd=self.ftp_password)
-        self.connect_p.retrlines(f"RETR {self.logfile}", callback=self._scum_ftp_logparser_getline)
-
-    def _scum_ftp_logparser_getline(self, string: str):
-        self.current_log.append(string)
-
-    def scum_log_parse(self) -> str:
-        """parse log"""
-        ret_val = []
-        self._scum_log_parser_retrive()
-        if self.current_timestamp < len(self.current_log):
-            # pylint: disable=unused-variable
-            for count, line in enumerate(self.current_log):
-                if line >= self.current_timestamp:
-                    ret_val.append(self.current_log[line])
-            # pylint: enable=unused-variable
-            self.current_timestamp = len(self.current_log)
-            self._scum_log_parser_store_timestamp()
-        self.current_log = []
-
-        return ret_val
+
+    def _close(self) -> None:
+        if self.connect_p is not None:
+            try:
+                self.connect_p.quit()
+            except FTP_ERRORS:
+                self.connect_p.close()
+        self.connect_p = None
+
+    def _st_mode(self, entry_type: str) -> int:
+        """file type bits of a MLSD type fact"""
+        return stat.S_IFDIR if entry_type in ("dir", "cdir", "pdir") else stat.S_IFREG
+
+    def _parse_mdtm(self, value: str) -> float:
+        # MLSD and MDTM timestamps are UTC, optionally with fractions
+        modified = datetime.strptime(value[:14], "%Y%m%d%H%M%S")
+        return modified.replace(tzinfo=timezone.utc).timestamp()
+
+    def _listdir_attr(self, path: str) -> list:
+        if self._mlsd:
+            try:
+                facts = ["type", "size", "modify"]
+                return [FileAttributes(name, self._st_mode(entry.get("type")),
+                                       int(entry.get("size", 0)),
+                                       self._parse_mdtm(entry.get("modify", "19700101000000")))
+                        for name, entry in self.connect_p.mlsd(path, facts=facts)
+                        if name not in (".", "..")]
+            except ftplib.error_perm:
+                # server doesn't know MLSD, fall back to NLST with SIZE and MDTM
+                self._mlsd = False
+
+        entries = []
+        names = self.connect_p.nlst(path)
+        # NLST switched to ASCII mode, SIZE has to count bytes
+        self.connect_p.voidcmd("TYPE I")
+        for name in names:
+            filename = name.rsplit("/", 1)[-1]
+            if not filename.endswith(".log"):
+                continue
+            file_path = f"{path}/{filename}"
+            size = self.connect_p.size(file_path)
+            mtime = self._parse_mdtm(self.connect_p.voidcmd(f"MDTM {file_path}").split()[-1])
+            entries.append(FileAttributes(filename, stat.S_IFREG, size, mtime))
+        return entries
+
+    def _read(self, path: str, offset: int, length: int) -> bytes:
+        if offset and self._rest:
+            try:
+                return self._retr(path, offset, length)
+            except ftplib.error_perm:
+                # the server may reject REST, if the file can be read from the
+                # start instead, do that from now on
+                content = self._read_from_start(path, offset, length)
+                self._rest = False
+                return content
+        if offset:
+            return self._read_from_start(path, offset, length)
+        return self._retr(path, 0, length)
+
+    def _read_from_start(self, path: str, offset: int, length: int) -> bytes:
+        """download the file up to offset + length and cut the bytes before offset"""
+        end = None if length is None else offset + length
+        return self._retr(path, 0, end)[offset:]
+
+    def _retr(self, path: str, offset: int, length: int) -> bytes:
+        chunks = []
+        remaining = length
+        # offsets are in bytes and listings switch to ASCII mode, so set
+        # binary mode before every transfer
+        self.connect_p.voidcmd("TYPE I")
+        # REST lets the server start the transfer at offset
+        with self.connect_p.transfercmd(f"RETR {path}", rest=offset or None) as conn:
+            while remaining is None or remaining > 0:
+                block = conn.recv(8192 if remaining is None else min(8192, remaining))
+                if not block:
+                    break
+                chunks.append(block)
+                if remaining is not None:
+                    remaining -= len(block)
+        try:
+            self.connect_p.voidresp()
+        except ftplib.error_temp:
+            # closing the data connection early aborts the transfer
+            pass
+        return b"".join(chunks)
+
+    def is_connected(self) -> bool:
+        return self.connect_p is not None
+
+    def is_alive(self) -> bool:
+        return self.connect_p is not None and self.connect_p.sock is not None
+
+    async def connect(self) -> None:
+        await self._run(self._connect)
+
+    async def close(self) -> None:
+        await self._run(self._close)
+
+    def shutdown(self) -> None:
+        """close connection and stop the thread"""
+        self._close()
+        self._executor.shutdown(wait=False)
+
+    async def listdir_attr(self, path: str) -> list:
+        return await self._run(self._listdir_attr, path)
+
+    async def read(self, path: str, offset: int = 0, length: int = None) -> bytes:
+        return await self._run(self._read, path, offset, length)
+
+class ScumFtpLogparser(LogSource):
+    """Log parser for servers that only offer FTP access"""
+    SOURCE_ERRORS = FTP_ERRORS
+    FILE_ERRORS = FTP_FILE_ERRORS
+
+    ftp: FTPLogClient = None
+
+    def __init__(self, server, port, user, passwd,
+                 logdirectoy, database=None, debug_callback=None, tail_mode=True,
+                 connect_timeout=10.0, max_backoff=600.0) -> None:
+        super().__init__(logdirectoy, database=database, debug_callback=debug_callback,
+                         tail_mode=tail_mode)
+        self.source_name = f"FTP-Server {server}"
+        self.ftp = FTPLogClient(server, port, user, passwd, connect_timeout=connect_timeout)
+        self.client = self.ftp
+        self.connection = ConnectionManager(self.ftp, self.source_name, errors=FTP_ERRORS,
+                                            max_backoff=max_backoff)
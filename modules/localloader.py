@@ -0,0 +1,54 @@
+"""
+    @Author: Thorsten liepert <thorsten@liepert.dev>
+    @Date: 18.10.2026
+    @CLicense: MIT
+    @Description: Get logfiles from a local directory when the bot runs on the game server
+"""
+import asyncio
+import mmap
+import os
+
+from modules.logsource import LogSource, LogClient, FileAttributes
+
+class LocalLogClient(LogClient):
+    """Read log files from the local file system"""
+
+    def _listdir_attr(self, path: str) -> list:
+        with os.scandir(path) as entries:
+            return [self._attributes(entry) for entry in entries]
+
+    def _attributes(self, entry: os.DirEntry) -> FileAttributes:
+        entry_stat = entry.stat()
+        return FileAttributes(entry.name, entry_stat.st_mode, entry_stat.st_size,
+                              entry_stat.st_mtime)
+
+    def _read(self, path: str, offset: int, length: int) -> bytes:
+        with open(path, "rb") as fp:
+            size = os.fstat(fp.fileno()).st_size
+            end = size if length is None else min(size, offset + length)
+            if end <= offset:
+                return b""
+            # map the file so only the requested region is paged in
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[offset:end]
+
+    async def listdir_attr(self, path: str) -> list:
+        """stat all entries of a directory"""
+        return await asyncio.to_thread(self._listdir_attr, path)
+
+    async def read(self, path: str, offset: int = 0, length: int = None) -> bytes:
+        """read length bytes starting at offset, the whole file if length is None"""
+        return await asyncio.to_thread(self._read, path, offset, length)
+
+class ScumLocalLogParser(LogSource):
+    """Log parser for log files on the same host as the bot"""
+
+    def __init__(self, logdirectoy, database=None, debug_callback=None,
+                 tail_mode=True) -> None:
+        super().__init__(logdirectoy, database=database, debug_callback=debug_callback,
+                         tail_mode=tail_mode)
+        self.source_name = f"local directory {logdirectoy}"
+        self.client = LocalLogClient()
+
+    async def _ensure_connected(self) -> bool:
+        return os.path.isdir(self.logdirectory)
@@ -0,0 +1,102 @@
+"""
+    @Author: Thorsten liepert <thorsten@liepert.dev>
+    @Date: 18.10.2026
+    @CLicense: MIT
+    @Description: Detect and decode the encoding of SCUM log files
+"""
+import codecs
+
+import chardet
+
+# UTF-32 has to be checked before UTF-16 as its little endian BOM
+# starts with the UTF-16 little endian BOM
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+
+def _check_bom(raw: bytes) -> str:
+    for bom, encoding in BOMS:
+        if raw.startswith(bom):
+            return encoding
+    return None
+
+def _check_utf16(raw: bytes) -> str:
+    """guess UTF-16 without BOM from the zero bytes of ASCII characters"""
+    sample = raw[:4096]
+    if len(sample) < 4:
+        return None
+    even_zeros = sample[0::2].count(0)
+    odd_zeros = sample[1::2].count(0)
+    half = len(sample) // 2
+    if odd_zeros > half * 0.9 and even_zeros < half * 0.1:
+        return "utf-16-le"
+    if even_zeros > half * 0.9 and odd_zeros < half * 0.1:
+        return "utf-16-be"
+    return None
+
+def _check_utf8(raw: bytes) -> str:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        # the sample may end in the middle of a character, so don't finalize
+        decoder.decode(raw[:4096], final=False)
+    except UnicodeDecodeError:
+        return None
+    return "utf-8"
+
+def detect_encoding(raw: bytes) -> str:
+    """detect the encoding of raw
+
+    Checks for a BOM, UTF-16 byte patterns and valid UTF-8 first and only
+    falls back to chardet if all of them are inconclusive.
+    """
+    encoding = _check_bom(raw) or _check_utf16(raw) or _check_utf8(raw)
+    if encoding is None:
+        encoding = chardet.detect(raw[:4096])['encoding']
+    if encoding is None:
+        encoding = "utf-8"
+
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return "utf-8"
+
+class LogDecoder:
+    """Incremental decoder for the chunks appended to one log file"""
+    encoding: str
+    bom: bytes
+
+    def __init__(self, encoding: str) -> None:
+        self.encoding = encoding
+        self.bom = b""
+        for bom, bom_encoding in BOMS:
+            if bom_encoding == encoding:
+                self.bom = bom
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+    def decode(self, raw: bytes, offset: int = 0) -> str:
+        """decode a chunk that starts at byte offset of the file"""
+        if offset == 0:
+            self._decoder.reset()
+            if self.bom and raw.startswith(self.bom):
+                raw = raw[len(self.bom):]
+        return self._decoder.decode(raw)
+
+    def to_utf8(self, raw: bytes, offset: int = 0) -> bytes:
+        """return a chunk that starts at byte offset of the file as UTF-8
+
+        UTF-8 content is passed through without decoding, the parsers only
+        decode the fields of matching lines.
+        """
+        if self.encoding != "utf-8":
+            return self.decode(raw, offset).encode("utf-8")
+        if offset == 0 and raw.startswith(self.bom):
+            return raw[len(self.bom):]
+        return raw
+
+    def newline(self) -> bytes:
+        """return the encoded line terminator"""
+        return codecs.encode("\n", self.encoding)
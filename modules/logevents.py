@@ -0,0 +1,97 @@
+"""
+    @Author: Thorsten liepert <thorsten@liepert.dev>
+    @Date: 18.10.2026
+    @CLicense: MIT
+    @Description: Event records returned by the log parsers
+"""
+import json
+from dataclasses import dataclass
+
+try:
+    # optional, decodes the kill payloads several times faster
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# The records are frozen and slotted: a backfill creates one per log line,
+# slots keep them small and frozen makes them safe to pass around.
+# epoch is the log timestamp converted once by the parser.
+
+@dataclass(frozen=True, slots=True)
+class LoginEvent:
+    """A player logged in or out"""
+    timestamp: str
+    epoch: float
+    ipaddress: str
+    steamid: int
+    username: str
+    state: str
+    x: float
+    y: float
+    z: float
+    drone: bool
+    hash: int
+
+@dataclass(frozen=True, slots=True)
+class KillDetails:
+    """The fields of a kill payload the bot uses"""
+    killer: str
+    victim: str
+    weapon: str
+
+@dataclass(frozen=True, slots=True)
+class KillEvent:
+    """A player was killed, payload is the undecoded UTF-8 JSON of the log line"""
+    timestamp: str
+    epoch: float
+    payload: bytes
+    hash: int
+
+    def details(self) -> KillDetails:
+        """decode the payload"""
+        event = json_loads(self.payload)
+        return KillDetails(killer=event["Killer"]["ProfileName"],
+                           victim=event["Victim"]["ProfileName"],
+                           weapon=event["Weapon"])
+
+@dataclass(frozen=True, slots=True)
+class BunkerEvent:
+    """A bunker changed its state
+
+    since and next are durations in seconds, None if the message has none.
+    x, y and z are None if the message has no coordinates.
+    """
+    timestamp: str
+    epoch: float
+    name: str
+    active: bool
+    since: int
+    next: int
+    x: float
+    y: float
+    z: float
+    hash: int
+
+    def has_coordinates(self) -> bool:
+        """return True if the message contained the bunker position"""
+        return self.x is not None
+
+@dataclass(frozen=True, slots=True)
+class FameEvent:
+    """Fame points of a player"""
+    name: str
+    steamid: int
+    points: int
+    hash: int
+
+@dataclass(frozen=True, slots=True)
+class AdminEvent:
+    """An admin command was invoked"""
+    timestamp: str
+    epoch: float
+    steamid: int
+    name: str
+    type: str
+    action: str
+    hash: int
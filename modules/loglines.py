@@ -0,0 +1,39 @@
+"""
+    @Author: Thorsten liepert <thorsten@liepert.dev>
+    @Date: 18.10.2026
+    @CLicense: MIT
+    @Description: Walk the lines of UTF-8 encoded log content without copying them
+"""
+GAME_VERSION_MARKER = b"Game version:"
+
+def line_ranges(data: bytes, start: int = 0, end: int = None):
+    """yield start and end offset of every line of data[start:end]
+
+    The ranges exclude the line terminator, so \\n and \\r\\n terminated
+    lines give the same ranges. Nothing is copied, the ranges are meant for
+    find() and pattern.match(data, pos, endpos).
+    """
+    if end is None:
+        end = len(data)
+    find = data.find
+    pos = start
+    while pos < end:
+        line_end = find(b"\n", pos, end)
+        if line_end < 0:
+            line_end = end
+        next_pos = line_end + 1
+        if line_end > pos and data[line_end - 1] == 13:
+            line_end -= 1
+        yield pos, line_end
+        pos = next_pos
+
+def is_game_version(data: bytes, start: int, end: int) -> bool:
+    """return True if the line is the game version header of a log file"""
+    return data.find(GAME_VERSION_MARKER, start, end) >= 0
+
+def has_log_entries(data: bytes) -> bool:
+    """return True if data contains a line that isn't blank or the game version"""
+    for start, end in line_ranges(data):
+        if data[start:end].strip() and not is_game_version(data, start, end):
+            return True
+    return False
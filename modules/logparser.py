@@ -6,77 +6,135 @@
 """
 # pylint: disable=broad-exception-caught
 import re
-import json
+import asyncio
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 import hashlib
 
+from modules.logsource import LOG_FILE_REGEX
+from modules.logevents import LoginEvent, KillEvent, BunkerEvent, FameEvent, AdminEvent
+from modules.timestamps import log_timestamp_to_epoch
+from modules.loglines import line_ranges, is_game_version
+from modules.output import Output
+
+# bytes a log line may be padded with
+WHITESPACE = b" \t\r\x0b\x0c"
+
+logging = Output(_stderr = False)
+
+def _text(value: bytes) -> str:
+    """decode a captured group"""
+    return value.decode("utf-8", "replace")
+
 class Parser:
-    """Abstract class for log data parser"""
-    log_regex = ""
+    """Abstract class for log data parser
+
+    The parsers work on UTF-8 encoded bytes. Lines are matched in place with
+    pattern.match(data, start, end) and only the captured groups of matching
+    lines are decoded.
+    """
+    log_regex = b""
     log_pattern = None
+    # bytes every line the parser can match contain, other lines are
+    # rejected by parse_many without running the regex
+    line_marker: bytes = None
+
+    def parse(self, line) -> object:
+        """parse a single line given as str or bytes, return an event record or None"""
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        line = line.rstrip(b"\r\n")
+        return self._parse(line, 0, len(line))
+
+    def parse_many(self, data: bytes):
+        """parse the lines of data and yield the event records
+
+        Blank lines, the game version header and lines without line_marker
+        are skipped, so are matched lines with fields that don't convert.
+        """
+        marker = self.line_marker
+        find = data.find
+        for start, end in line_ranges(data):
+            if start == end:
+                continue
+            if marker is not None and find(marker, start, end) < 0:
+                continue
+            if is_game_version(data, start, end):
+                continue
+            try:
+                result = self._parse(data, start, end)
+            except ValueError as e:
+                # e.g. an empty coordinate, the line would fail on every read
+                logging.error(f"Skipping malformed log line {_text(data[start:end])}: {e}")
+                continue
+            if result is not None:
+                yield result
 
-    def parse(self, string) -> dict:
-        """parse given string and return re-object"""
-        return self.log_pattern.match(str.strip(string))
+    def _parse(self, data: bytes, start: int, end: int) -> object:
+        """match the line data[start:end] and build its event record"""
+        match_start, match_end = start, end
+        while match_start < match_end and data[match_start] in WHITESPACE:
+            match_start += 1
+        while match_end > match_start and data[match_end - 1] in WHITESPACE:
+            match_end -= 1
+        result = self.log_pattern.match(data, match_start, match_end)
+        if result is None:
+            return None
+        return self._event(result, data, start, end)
 
-    def _hash_string(self, s):
-        return hashlib.sha256(s.encode('utf-8')).hexdigest()
+    def _event(self, result, data: bytes, start: int, end: int) -> object:
+        """build the event record of a matched line"""
+        raise NotImplementedError
+
+    def _hash_line(self, data: bytes, start: int, end: int) -> int:
+        """return the 64 bit key of a log line, the first 8 bytes of its
+        SHA-256 as signed integer so it fits a SQLite INTEGER"""
+        digest = hashlib.sha256(memoryview(data)[start:end]).digest()
+        return int.from_bytes(digest[:8], "big", signed=True)
 
 
 class LoginParser(Parser):
     """implementation of parser for the login log file type"""
+    # pylint: disable=line-too-long
+    log_regex = rb"([0-9.-]*):\s'([0-9.]*)\s([0-9]*):(.+)\([0-9]+\)'\slogged ([in|out]+)\sat:\sX=([0-9.-]*)\sY=([0-9.-]*)\sZ=([0-9.-]*)"
+    log_pattern = re.compile(log_regex)
+    line_marker = b"logged"
+    # pylint: enable=line-too-long
 
-    def __init__(self) -> None:
-        # super().__init__()
-        # pylint: disable=line-too-long
-        self.log_regex = r"^([0-9.-]*):\s'([0-9.]*)\s([0-9]*):(.+)\([0-9]+\)'\slogged ([in|out]+)\sat:\sX=([0-9.-]*)\sY=([0-9.-]*)\sZ=([0-9.-]*)"
-        self.log_pattern = re.compile(self.log_regex)
-        # pylint: enable=line-too-long
-
-    def parse(self, string) -> dict:
+    def _event(self, result, data: bytes, start: int, end: int) -> LoginEvent:
         """implementation of the parser method for login log file type"""
-        ret_val = {}
-        drone = False
-        result = super().parse(string)
-        if "drone" in string:
-            drone = True
-        if result is not None:
-            ret_val = {
-                "timestamp" : result.group(1),
-                "ipaddress":  result.group(2),
-                "steamID" : result.group(3),
-                "username" : result.group(4),
-                "state" : result.group(5),
-                "coordinates" :{
-                    "x" : result.group(6),
-                    "y" : result.group(7),
-                    "z" : result.group(8),
-                },
-                "drone": drone,
-                "hash": self._hash_string(string)
-            }
-        return ret_val
+        timestamp, ipaddress, steamid, username, state, x, y, z = result.groups()
+        timestamp = _text(timestamp)
+        return LoginEvent(timestamp=timestamp,
+                          epoch=log_timestamp_to_epoch(timestamp),
+                          ipaddress=_text(ipaddress),
+                          steamid=int(steamid),
+                          username=_text(username),
+                          state=_text(state),
+                          x=float(x),
+                          y=float(y),
+                          z=float(z),
+                          drone=data.find(b"drone", start, end) >= 0,
+                          hash=self._hash_line(data, start, end))
 
 class KillParser(Parser):
     """implementation of parser for the kill log file type"""
+    log_regex = rb"([0-9.-]*):\s({.*)$"
+    log_pattern = re.compile(log_regex)
+    line_marker = b"{"
 
-    def __init__(self) -> None:
-        # super().__init__()
-        # pylint: disable=line-too-long
-        self.log_regex = r"^([0-9.-]*):\s({.*)$"
-        self.log_pattern = re.compile(self.log_regex)
-        # pylint: enable=line-too-long
-
-    def parse(self, string) -> dict:
-        """implementation of the parser method for login log file type"""
-        ret_val = {}
-        result = super().parse(string)
-        if result is not None:
-            ret_val = {
-                "timestamp" : result.group(1),
-                "event": json.loads(result.group(2)),
-                "hash": self._hash_string(string)
-            }
+    def _event(self, result, data: bytes, start: int, end: int) -> KillEvent:
+        """implementation of the parser method for kill log file type"""
+        timestamp = _text(result.group(1))
+        # the JSON payload is only decoded by KillEvent.details() once the
+        # event turned out to be new
+        ret_val = KillEvent(timestamp=timestamp,
+                            epoch=log_timestamp_to_epoch(timestamp),
+                            payload=result.group(2),
+                            hash=self._hash_line(data, start, end))
 
         # Event Structure will be like
         # {
@@ -118,179 +176,164 @@ class KillParser(Parser):
         return ret_val
 
 class BunkerParser(Parser):
-    """implementation of parser for the kill log file type"""
-    # pylint: disable=line-too-long
+    """implementation of parser for the bunker log file type
 
-    bunkerRegex = {
-        # 2024.09.10-02.33.17: [LogBunkerLock] D2 Bunker is Active. Activated 00h 00m 00s ago. X=-243813.062 Y=568471.812 Z=72278.109
-        "Active" : r"^([0-9.-]*):\s\[[A-Za-z]+\]\s([A-Z]{1}[0-9]{1})[A-Za-z\s.]+([0-9]{2})h ([0-9]{2})m ([0-9]{2})s[A-Za-z\s.]+\sX=([0-9.-]*)\sY=([0-9.-]*)\sZ=([0-9.-]*)$",
-        # 2024.09.10-02.33.17: [LogBunkerLock] Z1 Bunker is Locked. Locked 00h 00m 00s ago, next Activation in 25h 47m 38s. X=-564608.062 Y=-724692.062 Z=15077.148
-        "Locked" : r"^([0-9.-]*):\s\[[A-Za-z]+\]\s([A-Z]{1}[0-9]{1})[A-Za-z\s.]+([0-9]{2})h ([0-9]{2})m ([0-9]{2})s[A-Za-z\s,.]+([0-9]{2})h ([0-9]{2})m ([0-9]{2})s.\sX=([0-9.-]*)\sY=([0-9.-]*)\sZ=([0-9.-]*)$",
-        # 2024.09.10-02.32.59: [LogBunkerLock] B3 Bunker Activated 17h 35m 35s ago
-        "Activated" : r"^([0-9.-]*):\s\[[A-Za-z]+\]\s([A-Z]{1}[0-9]{1})[A-Za-z\s.]+([0-9]{2})h ([0-9]{2})m ([0-9]{2})s[A-Za-z\s.]+$",
-        # 2024.09.10-04.20.55: [LogBunkerLock] D2 Bunker Deactivated
-        "Deactivated" : r"^([0-9.-]*):\s\[[A-Za-z\s]+\]\s([A-Z]{1}[0-9]{1})\s[A-Za-z\s]+$",
-    }
+    All four bunker messages are matched by one pattern compiled at class
+    load, the named groups that matched tell which message it was.
+    """
+    # pylint: disable=line-too-long
+    # 2024.09.10-02.33.17: [LogBunkerLock] D2 Bunker is Active. Activated 00h 00m 00s ago. X=-243813.062 Y=568471.812 Z=72278.109
+    # 2024.09.10-02.33.17: [LogBunkerLock] Z1 Bunker is Locked. Locked 00h 00m 00s ago, next Activation in 25h 47m 38s. X=-564608.062 Y=-724692.062 Z=15077.148
+    # 2024.09.10-02.32.59: [LogBunkerLock] B3 Bunker Activated 17h 35m 35s ago
+    # 2024.09.10-04.20.55: [LogBunkerLock] D2 Bunker Deactivated
+    log_regex = (rb"(?P<timestamp>[0-9.-]+):\s\[[A-Za-z\s]+\]\s(?P<name>[A-Z][0-9])\sBunker\s"
+                 rb"(?:is\s(?P<state>Active|Locked)\.\s(?:Activated|Locked)|(?P<event>Activated|Deactivated))"
+                 rb"(?:\s(?P<since_h>[0-9]+)h\s(?P<since_m>[0-9]+)m\s(?P<since_s>[0-9]+)s\sago)?"
+                 rb"(?:,\snext\sActivation\sin\s(?P<next_h>[0-9]+)h\s(?P<next_m>[0-9]+)m\s(?P<next_s>[0-9]+)s)?"
+                 rb"\.?(?:\sX=(?P<x>[0-9.-]+)\sY=(?P<y>[0-9.-]+)\sZ=(?P<z>[0-9.-]+))?$")
+    log_pattern = re.compile(log_regex)
+    line_marker = b" Bunker "
+    # pylint: enable=line-too-long
 
-    # def __init__(self) -> None:
-    #     super().__init__()
+    def _duration(self, result, prefix) -> int:
+        """return the duration of the named groups prefix_h/_m/_s in seconds"""
+        if result.group(f"{prefix}_h") is None:
+            return None
+        return int(result.group(f"{prefix}_h")) * 3600 + \
+               int(result.group(f"{prefix}_m")) * 60 + \
+               int(result.group(f"{prefix}_s"))
 
+    def _event(self, result, data: bytes, start: int, end: int) -> BunkerEvent:
+        """implementation of the parser method for bunker log file type"""
+        x = y = z = None
+        if result.group("x") is not None:
+            x, y, z = float(result.group("x")), float(result.group("y")), float(result.group("z"))
 
-    def parse(self, string) -> dict:
-        """implementation of the parser method for login log file type"""
-        retval = {
-            "name": str,
-            "active": bool,
-            "timestamp": str,
-            "hash": str,
-            "since": {
-                "h": int,
-                "m": int,
-                "s": int,
-            },
-            "next": {
-                "h": int,
-                "m": int,
-                "s": int,
-            },
-            "coordinates": {
-                "x": float,
-                "y": float,
-                "z": float,
-            },
-        }
-        if "Active" in string:
-            self.log_regex = self.bunkerRegex["Active"]
-        elif "Locked" in string:
-            self.log_regex = self.bunkerRegex["Locked"]
-        elif "Activated" in string:
-            self.log_regex = self.bunkerRegex["Activated"]
-        elif "Deactivated" in string:
-            self.log_regex = self.bunkerRegex["Deactivated"]
-        else:
-            retval = {}
-
-        self.log_pattern = re.compile(self.log_regex)
-        result = super().parse(string)
-        if result:
-            if "Active" in string:
-                retval.update({
-                    "name": result.group(2),
-                    "active": True,
-                    "timestamp": result.group(1),
-                    "hash": self._hash_string(string),
-                    "since": {
-                        "h": result.group(3),
-                        "m": result.group(4),
-                        "s": result.group(5),
-                    },
-                    "next": {},
-                    "coordinates": {
-                        "x": result.group(6),
-                        "y": result.group(7),
-                        "z": result.group(8),
-                    }
-                }
-                )
-            elif "Locked" in string:
-                retval.update({
-                    "name": result.group(2),
-                    "active": False,
-                    "timestamp": result.group(1),
-                    "hash": self._hash_string(string),
-                    "since": {
-                        "h": result.group(3),
-                        "m": result.group(4),
-                        "s": result.group(5),
-                    },
-                    "next": {
-                        "h": result.group(6),
-                        "m": result.group(7),
-                        "s": result.group(8),
-                    },
-                    "coordinates": {
-                        "x": result.group(9),
-                        "y": result.group(10),
-                        "z": result.group(11),
-                    }
-                }
-                )
-            elif "Activated" in string:
-                retval.update({
-                    "name": result.group(2),
-                    "active": True,
-                    "timestamp": result.group(1),
-                    "hash": self._hash_string(string),
-                    "since": {
-                        "h": result.group(3),
-                        "m": result.group(4),
-                        "s": result.group(5),
-                    },
-                    "next": {},
-                    "coordinates": {}
-                }
-                )
-            elif "Deactivated" in string:
-                retval.update({
-                    "name": result.group(2),
-                    "active": False,
-                    "timestamp": result.group(1),
-                    "hash": self._hash_string(string),
-                    "since": {},
-                    "next": {},
-                    "coordinates": {}
-                }
-                )
-            else:
-                retval = {}
-        else:
-            retval = {}
-
-        return retval
+        timestamp = _text(result.group("timestamp"))
+        active = result.group("state") == b"Active" or result.group("event") == b"Activated"
+        return BunkerEvent(timestamp=timestamp,
+                           epoch=log_timestamp_to_epoch(timestamp),
+                           name=_text(result.group("name")),
+                           active=active,
+                           since=self._duration(result, "since"),
+                           next=self._duration(result, "next"),
+                           x=x, y=y, z=z,
+                           hash=self._hash_line(data, start, end))
 
 class FamepointParser(Parser):
     """Parse famepoints log"""
-    def __init__(self) -> None:
-        super().__init__()
-        self.log_regex = r"[A-Za-z]+\s([A-Za-z]+)\(([0-9]+)\)[\sa-zA-Z]+([0-9.]+).*$"
-        self.log_pattern = re.compile(self.log_regex)
-
-    def parse(self, string) -> dict:
-        result =  super().parse(string)
-        retval = {}
-        if result:
-            retval.update({
-                "name": result.group(1),
-                "steamid": result.group(2),
-                "points": result.group(3),
-                "hash": self._hash_string(string)
-            })
-
-        return retval
-    
+    log_regex = rb"[A-Za-z]+\s([A-Za-z]+)\(([0-9]+)\)[\sa-zA-Z]+([0-9.]+).*$"
+    log_pattern = re.compile(log_regex)
+    line_marker = b"("
+
+    def _event(self, result, data: bytes, start: int, end: int) -> FameEvent:
+        return FameEvent(name=_text(result.group(1)),
+                         steamid=int(result.group(2)),
+                         # points may be logged with decimals, the table stores whole points
+                         points=int(float(result.group(3))),
+                         hash=self._hash_line(data, start, end))
+
 class AdminParser(Parser):
     """parse the admin log"""
+    log_regex = rb"([0-9.-]*):\s'([0-9]+?):(.+?)\([0-9]+\)'\s(.+?):\s(.*?)$"
+    log_pattern = re.compile(log_regex)
+    line_marker = b"'"
+
+    def _event(self, result, data: bytes, start: int, end: int) -> AdminEvent:
+        timestamp, steamid, name, admin_type, action = result.groups()
+        timestamp = _text(timestamp)
+        return AdminEvent(timestamp=timestamp,
+                          epoch=log_timestamp_to_epoch(timestamp),
+                          steamid=int(steamid),
+                          name=_text(name),
+                          type=_text(admin_type),
+                          action=_text(action),
+                          hash=self._hash_line(data, start, end))
+
+# Parser per log file base name, event_kill files are not parsed
+PARSERS = {
+    "login": LoginParser,
+    "kill": KillParser,
+    "gameplay": BunkerParser,
+    "famepoints": FamepointParser,
+    "admin": AdminParser,
+}
+
+def get_parser(path: str) -> Parser:
+    """return a parser for the log file path, None if the file type isn't parsed"""
+    match = re.match(LOG_FILE_REGEX, path.rsplit("/", 1)[-1])
+    if not match or match.group(1) not in PARSERS:
+        return None
+    return PARSERS[match.group(1)]()
+
+def _parse_chunk(parser_class, data: bytes) -> list:
+    """parse a chunk of complete lines in a worker process"""
+    return list(parser_class().parse_many(data))
+
+class ParserPool:
+    """Parse large amounts of log lines in worker processes
+
+    Parsing is pure CPU work, so a big backfill would block the event loop
+    for a long time. Inputs of at least threshold lines are split into
+    chunks that are parsed by max_workers processes, the events are returned
+    in the order of the lines. Smaller inputs are parsed in the calling
+    process. The processes are started on first use.
+    """
+    max_workers: int = 2
+    threshold: int = 20000
+    min_chunk: int = 5000
+
+    _executor: ProcessPoolExecutor = None
+
+    def __init__(self, max_workers: int = 2, threshold: int = 20000, min_chunk: int = 5000) -> None:
+        self.max_workers = max_workers
+        self.threshold = threshold
+        self.min_chunk = max(1, min_chunk)
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # forking a process that already runs threads (discord, the SFTP
+            # pool) can deadlock the children, so the workers are spawned
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _chunks(self, data: bytes, lines: int) -> list:
+        """split data into line aligned chunks"""
+        # several chunks per worker, so finished chunks are transferred
+        # back while the workers still parse the next ones
+        chunk_lines = max(self.min_chunk, -(-lines // (self.max_workers * 4)))
+        chunk_size = max(1, len(data) * chunk_lines // lines)
+        chunks = []
+        pos = 0
+        while pos < len(data):
+            end = data.find(b"\n", min(pos + chunk_size, len(data)) - 1)
+            end = len(data) if end < 0 else end + 1
+            chunks.append(data[pos:end])
+            pos = end
+        return chunks
+
+    async def parse(self, parser: Parser, data: bytes):
+        """return an iterable of the events parsed from the lines of data"""
+        lines = data.count(b"\n") + 1
+        if self.max_workers < 1 or lines < self.threshold:
+            return parser.parse_many(data)
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            results = await asyncio.gather(*[
+                loop.run_in_executor(executor, _parse_chunk, type(parser), chunk)
+                for chunk in self._chunks(data, lines)])
+        except BrokenProcessPool:
+            # a worker died, start new ones next time and parse here
+            self.shutdown()
+            return parser.parse_many(data)
+        return itertools.chain.from_iterable(results)
 
-    def __init__(self) -> None:
-        # super().__init__()
-        # pylint: disable=line-too-long
-        self.log_regex = r"^([0-9.-]*):\s'([0-9]+?):(.+?)\([0-9]+\)'\s(.+?):\s(.*?)$"
-        self.log_pattern = re.compile(self.log_regex)
-        # pylint: enable=line-too-long
-
-    def parse(self, string) -> dict:
-        result = super().parse(string)
-        retval = {}
-        if result:
-            retval.update({
-                "time": result.group(1),
-                "steamid": result.group(2),
-                "name": result.group(3),
-                "type": result.group(4),
-                "action": result.group(5),
-                "hash": self._hash_string(string)
-            })
-
-        return retval
-
-# pylint: enable=line-too-long
+    def shutdown(self) -> None:
+        """stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
@@ -0,0 +1,508 @@
+"""
+    @Author: Thorsten liepert <thorsten@liepert.dev>
+    @Date: 18.10.2026
+    @CLicense: MIT
+    @Description: Common base of all log file sources
+"""
+import asyncio
+import random
+import re
+import stat
+from datetime import datetime
+
+import hashlib
+
+from modules.output import Output
+from modules.datamanager import ScumLogDataManager
+from modules.logencoding import LogDecoder, detect_encoding
+from modules.loglines import has_log_entries
+
+LOG_FILE_REGEX = r'(.+?)_(\d{14})\.log$'
+# Bytes before the stored offset that are read again to detect rewritten files,
+# a multiple of 4 so UTF-16 and UTF-32 characters stay aligned
+HASH_OVERLAP = 64
+
+class FileAttributes:
+    """The stat fields of a directory entry the log sources use"""
+    filename: str
+    st_mode: int
+    st_size: int
+    st_mtime: float
+
+    def __init__(self, filename: str, st_mode: int, st_size: int, st_mtime: float) -> None:
+        self.filename = filename
+        self.st_mode = st_mode
+        self.st_size = st_size
+        self.st_mtime = st_mtime
+
+class LogClient:
+    """Interface of the clients a LogSource reads the log files with"""
+
+    def is_connected(self) -> bool:
+        """return True if a connection was opened"""
+        return True
+
+    def is_alive(self) -> bool:
+        """return True if the connection is still usable"""
+        return True
+
+    def set_keepalive(self, interval: int) -> None:
+        """keep an idle connection open, interval in seconds"""
+
+    async def connect(self) -> None:
+        """open the connection"""
+
+    async def close(self) -> None:
+        """close the connection"""
+
+    def shutdown(self) -> None:
+        """close the connection and stop the threads of the client"""
+
+    async def listdir_attr(self, path: str) -> list:
+        """list a directory as FileAttributes, or objects with the same fields"""
+        raise NotImplementedError
+
+    async def read(self, path: str, offset: int = 0, length: int = None) -> bytes:
+        """read length bytes starting at offset, the whole file if length is None"""
+        raise NotImplementedError
+
+
+class ConnectionManager:
+    """Keep the connection of a client open and back off while the server is unreachable
+
+    After failure_threshold consecutive failures the circuit opens and no
+    connection attempts are made until the backoff delay has passed. The
+    delay doubles with every further failure up to max_backoff and is
+    jittered so several bots don't reconnect in lockstep.
+    """
+    client: LogClient
+    name: str = ""
+    errors: tuple = (OSError,)
+    keepalive_interval: int = 30
+    base_backoff: float = 5.0
+    max_backoff: float = 600.0
+    failure_threshold: int = 3
+
+    failures: int = 0
+    retry_at: float = 0.0
+
+    logging: Output
+
+    def __init__(self, client: LogClient, name: str, errors: tuple = (OSError,),
+                 keepalive_interval: int = 30, base_backoff: float = 5.0,
+                 max_backoff: float = 600.0, failure_threshold: int = 3) -> None:
+        self.client = client
+        self.name = name
+        self.errors = errors
+        self.keepalive_interval = keepalive_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = max(1, failure_threshold)
+        self.failures = 0
+        self.retry_at = 0.0
+        self.logging = Output(_stderr = False)
+
+    def is_open(self) -> bool:
+        """return True while connection attempts are suspended"""
+        return datetime.now().timestamp() < self.retry_at
+
+    async def ensure_connected(self) -> bool:
+        """return True if the connection is usable, reconnect if necessary
+
+        Returns False right away while the circuit is open.
+        """
+        if self.client.is_connected() and self.client.is_alive():
+            return True
+        if self.is_open():
+            return False
+
+        try:
+            self.logging.info(f"Try to connect to {self.name}.....")
+            await self.client.connect()
+            self.client.set_keepalive(self.keepalive_interval)
+        except self.errors as e:
+            await self.report_failure(e)
+            return False
+
+        if self.failures > 0:
+            self.logging.info(f"Connected to {self.name} after {self.failures} failed attempts.")
+        self.failures = 0
+        self.retry_at = 0.0
+        return True
+
+    async def report_failure(self, error: Exception) -> None:
+        """close the broken connection and schedule the next attempt"""
+        self.failures += 1
+        self.logging.error(f"Connection to {self.name} failed ({self.failures}x): {str(error)}")
+        try:
+            await self.client.close()
+        except self.errors:
+            pass
+
+        if self.failures >= self.failure_threshold:
+            exponent = self.failures - self.failure_threshold
+            delay = min(self.max_backoff, self.base_backoff * 2 ** exponent)
+            delay = random.uniform(delay / 2, delay)
+            self.retry_at = datetime.now().timestamp() + delay
+            self.logging.warning(f"{self.name} unreachable, next attempt in {int(delay)} seconds.")
+
+class LogSource:
+    """Base class of the log sources
+
+    Keeps track of what was already read from the SCUM log files and
+    returns only new content. Subclasses set a LogClient as client and,
+    for remote servers, a ConnectionManager as connection.
+    """
+    # Errors of the client that skip the current check instead of failing the loop
+    SOURCE_ERRORS: tuple = (OSError,)
+    # Errors reading a single file, the file is skipped and the connection kept
+    FILE_ERRORS: tuple = (FileNotFoundError, PermissionError)
+
+    client: LogClient = None
+    connection: ConnectionManager = None
+    source_name = ""
+    logdirectory = "/"
+    last_fetch_time = datetime.fromtimestamp(0)
+    file_groups: dict
+    log_offsets: dict
+    group_encodings: dict
+    file_decoders: dict
+    file_fingerprints: dict
+    log_checkpoints: dict
+    backfill_groups: dict
+    backfill_complete: bool = False
+    tail_mode: bool = True
+    new_log_data = {}
+    sent_entries: set
+    debug_message = None
+    _retry= False
+    db: ScumLogDataManager = None
+
+    logging : Output
+
+    def __init__(self, logdirectoy, database=None, debug_callback=None, tail_mode=True) -> None:
+        self.logdirectory = logdirectoy
+
+        if isinstance(database, ScumLogDataManager):
+            # borrow the connection of the bot
+            self.db = database
+        else:
+            self.db = ScumLogDataManager(database)
+        self.tail_mode = tail_mode
+        self.group_encodings = {}
+        self.file_decoders = {}
+        self.file_fingerprints = {}
+        self.file_groups = {}
+        self.backfill_groups = {}
+
+        self.logging = Output(_stderr = False)
+
+        if debug_callback is not None:
+            self.debug_message = debug_callback
+        else:
+            self.debug_message = self._debug_to_stdout
+
+        self.last_fetch_time = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        self.get_existing_log_offsets()
+        self.get_existing_log_checkpoints()
+
+        self.sent_entries = set()
+
+    async def _ensure_connected(self) -> bool:
+        """return False if the source can't be reached right now"""
+        if self.connection is None:
+            return True
+        return await self.connection.ensure_connected()
+
+    async def _report_failure(self, error: Exception) -> None:
+        """called when an operation of the client failed"""
+        if self.connection is None:
+            self.logging.error(f"Reading logs from {self.source_name} failed: {str(error)}")
+        else:
+            await self.connection.report_failure(error)
+
+    async def _retrieve_files(self, backfill: bool = False) -> bool:
+        self.logging.info(f"retrive file listing from {self.source_name}")
+        if not await self._ensure_connected():
+            self.logging.warning(f"{self.source_name} not reachable. Skipping log check.")
+            return False
+        self.backfill_groups = {}
+        try:
+            for entry in await self.client.listdir_attr(self.logdirectory):
+                entry_path = f"{self.logdirectory}/{entry.filename}"
+                if not stat.S_ISDIR(entry.st_mode):
+                    if backfill:
+                        self._add_backfill_file(entry_path, entry)
+                    if entry.filename.endswith(".log") and \
+                       datetime.fromtimestamp(entry.st_mtime) > self.last_fetch_time:
+                        base_name = re.match(LOG_FILE_REGEX, entry.filename)
+                        if base_name:
+                            base_name = base_name.group(1)
+                            if base_name not in self.file_groups or \
+                               entry.st_mtime > self.file_groups[base_name][1] or \
+                               entry_path == self.file_groups[base_name][0]:
+                                self.file_groups.update({base_name:  [entry_path, entry.st_mtime,
+                                                                      entry.st_size]})
+        except self.SOURCE_ERRORS as e:
+            # Something went wrong with the connection
+            # Try to reopen and rety once
+            await self._report_failure(e)
+            if not self._retry and await self._ensure_connected():
+                self._retry = True
+                try:
+                    return await self._retrieve_files(backfill)
+                finally:
+                    self._retry = False
+            return False
+        return True
+
+    async def _retrive_file_content(self) -> dict:
+        self.new_log_data = {}
+        groups = list(self.file_groups.values())
+        # all groups are fetched at once, the client may limit the parallel transfers
+        results = await asyncio.gather(*[
+            self._retrive_group_content(base_name, latest_file, file_mtime, file_size)
+            for base_name, (latest_file, file_mtime, file_size) in self.file_groups.items()
+        ], return_exceptions=True)
+
+        failed = []
+        for index, result in enumerate(results):
+            if isinstance(result, self.FILE_ERRORS):
+                # e.g. rotated away since the listing, the connection is fine.
+                # The file is tried again once its size or mtime changed
+                latest_file, file_mtime, file_size = groups[index]
+                self.logging.warning(f"Skipping {latest_file}: {str(result)}")
+                self.file_fingerprints.update({latest_file: (file_size, file_mtime)})
+                results[index] = (latest_file, None)
+            elif isinstance(result, BaseException):
+                failed.append(result)
+        for error in failed:
+            if not isinstance(error, self.SOURCE_ERRORS):
+                raise error
+        if failed:
+            # groups that failed keep their offsets and are read again next time
+            await self._report_failure(failed[0])
+        results = [result for result in results if not isinstance(result, BaseException)]
+
+        # forget decoders and fingerprints of rotated files
+        current_files = [latest_file for latest_file, _ in results]
+        for path in list(self.file_decoders):
+            if path not in current_files:
+                self.file_decoders.pop(path)
+        for path in list(self.file_fingerprints):
+            if path not in current_files:
+                self.file_fingerprints.pop(path)
+        for latest_file, content in results:
+            if content:
+                self.new_log_data.update({latest_file: [content, self.sent_entries]})
+                if self.debug_message is not None:
+                    self.debug_message(f"Neue Logeinträge erkannt: {latest_file}")
+        return self.new_log_data
+
+    async def _retrive_group_content(self, base_name: str, latest_file: str,
+                                     file_mtime: float, file_size: int) -> tuple:
+        fingerprint = (file_size, file_mtime)
+        if self.file_fingerprints.get(latest_file) == fingerprint:
+            # unchanged since the last check, don't even open it
+            return latest_file, None
+
+        self.logging.info(f"retrive file content for {base_name}")
+        if self.tail_mode:
+            content = await self._read_appended_content(base_name, latest_file, file_size)
+        else:
+            content = await self._read_whole_content(base_name, latest_file)
+        self.file_fingerprints.update({latest_file: fingerprint})
+        self.update_log_checkpoint(base_name, latest_file)
+        return latest_file, content
+
+    def _add_backfill_file(self, entry_path: str, entry) -> None:
+        """remember entry if it is not older than the checkpoint of its group"""
+        match = re.match(LOG_FILE_REGEX, entry.filename)
+        if not match:
+            return
+        base_name, suffix = match.group(1), match.group(2)
+        if base_name not in self.log_checkpoints:
+            # never read this group, nothing to catch up on
+            return
+        if suffix < self._get_suffix(self.log_checkpoints[base_name]):
+            return
+        self.backfill_groups.setdefault(base_name, []).append(
+            [suffix, entry_path, entry.st_mtime, entry.st_size])
+
+    def _get_suffix(self, path: str) -> str:
+        match = re.match(LOG_FILE_REGEX, path.rsplit("/", 1)[-1])
+        if match:
+            return match.group(2)
+        return ""
+
+    def _get_decoder(self, base_name: str, path: str, head: bytes) -> LogDecoder:
+        """return the decoder of path, head is only inspected if the
+        encoding of the file group isn't known yet"""
+        if path not in self.file_decoders:
+            if base_name not in self.group_encodings:
+                encoding = detect_encoding(head)
+                self.logging.info(f"Detected encoding {encoding} for {base_name}")
+                self.group_encodings.update({base_name: encoding})
+            self.file_decoders.update({path: LogDecoder(self.group_encodings[base_name])})
+        return self.file_decoders[path]
+
+    async def _read_whole_content(self, base_name: str, path: str) -> bytes:
+        """read the whole file as UTF-8, return None if no complete line was added"""
+        raw_content = await self.client.read(path)
+        decoder = self._get_decoder(base_name, path, raw_content)
+        raw_content = self._complete_lines(raw_content, decoder.newline())
+
+        offset, tail_hash = self.log_offsets.get(path, [0, ""])
+        tail_start = max(0, offset - HASH_OVERLAP)
+        if len(raw_content) < offset or \
+           not self._check_tail(raw_content[tail_start:offset], tail_hash):
+            self.logging.warning(f"{path} was rewritten. Reading from start.")
+            offset = 0
+        if len(raw_content) == offset:
+            return None
+
+        self.update_log_offsets(path, len(raw_content), self._tail_hash(raw_content))
+
+        content = decoder.to_utf8(raw_content)
+        return content if has_log_entries(content) else None
+
+    async def _read_appended_content(self, base_name: str, path: str, file_size: int) -> bytes:
+        """read only the bytes appended to path since the stored offset as UTF-8"""
+        offset, tail_hash = self.log_offsets.get(path, [0, ""])
+        if file_size < offset:
+            # file was truncated or replaced, start over
+            self.logging.warning(f"{path} shrunk from {offset} to {file_size} bytes. "
+                                 "Reading from start.")
+            offset, tail_hash = 0, ""
+
+        # read the last bytes before offset again to see if the file was replaced,
+        # also if the size didn't change, only the mtime
+        tail_start = max(0, offset - HASH_OVERLAP)
+        raw_content = await self.client.read(path, tail_start, file_size - tail_start)
+        if not self._check_tail(raw_content[:offset - tail_start], tail_hash):
+            self.logging.warning(f"{path} was rewritten. Reading from start.")
+            offset, tail_start = 0, 0
+            raw_content = await self.client.read(path, 0, file_size)
+        overlap = raw_content[:offset - tail_start]
+        raw_content = raw_content[offset - tail_start:]
+        if not raw_content:
+            return None
+
+        if offset == 0:
+            head = raw_content
+        elif path not in self.file_decoders and base_name not in self.group_encodings:
+            # resumed after a restart, the BOM is only at the start of the file
+            head = await self.client.read(path, 0, min(file_size, 4096))
+        else:
+            head = b""
+        decoder = self._get_decoder(base_name, path, head)
+
+        # only consume complete lines, a partial last line is read again next time
+        raw_content = self._complete_lines(raw_content, decoder.newline())
+        if not raw_content:
+            return None
+
+        content = decoder.to_utf8(raw_content, offset)
+
+        tail_hash = self._tail_hash(overlap + raw_content[-HASH_OVERLAP:])
+        self.update_log_offsets(path, offset + len(raw_content), tail_hash)
+
+        return content if has_log_entries(content) else None
+
+    def _check_tail(self, tail: bytes, tail_hash: str) -> bool:
+        """return True if tail still matches the bytes last read, offsets stored
+        without a tail hash are trusted"""
+        return not tail_hash or hashlib.sha256(tail).hexdigest() == tail_hash
+
+    def _tail_hash(self, content: bytes) -> str:
+        """return the hash of the last HASH_OVERLAP bytes of content"""
+        return hashlib.sha256(content[-HASH_OVERLAP:]).hexdigest()
+
+    def _complete_lines(self, raw_content: bytes, newline: bytes) -> bytes:
+        """cut raw_content after the last line terminator"""
+        width = len(newline)
+        end = raw_content.rfind(newline)
+        # in UTF-16/32 a newline has to start on a character boundary
+        while end > 0 and end % width != 0:
+            end = raw_content.rfind(newline, 0, end + width - 1)
+        if end < 0:
+            return b""
+        return raw_content[:end + width]
+
+    def reload_read_state(self) -> None:
+        """forget what was read since the last commit of the database
+
+        Called when the unit of work storing a cycle was rolled back, the
+        rolled back content is read again on the next check.
+        """
+        self.file_fingerprints = {}
+        self.file_decoders = {}
+        self.get_existing_log_offsets()
+        self.get_existing_log_checkpoints()
+
+    def get_existing_log_offsets(self) -> None:
+        """loads byte offsets and tail hashes of already read files"""
+        self.log_offsets = self.db.get_log_file_offsets()
+
+    def update_log_offsets(self, path: str, offset: int, tail_hash: str) -> None:
+        """update byte offset and tail hash of a read file"""
+        self.log_offsets.update({path: [offset, tail_hash]})
+        self.db.update_log_file_offset(path, offset, tail_hash)
+
+    def get_existing_log_checkpoints(self) -> None:
+        """loads the newest file read per log group"""
+        self.log_checkpoints = self.db.get_log_checkpoints()
+
+    def update_log_checkpoint(self, base_name: str, path: str) -> None:
+        """update the newest file read of a log group"""
+        if self.log_checkpoints.get(base_name) == path or \
+           self._get_suffix(path) < self._get_suffix(self.log_checkpoints.get(base_name, "")):
+            return
+        self.log_checkpoints.update({base_name: path})
+        self.db.update_log_checkpoint(base_name, path)
+
+    async def scum_log_backfill(self):
+        """Catch up on every log file written since the stored checkpoints
+
+        Yields the new content one file at a time in the same layout as
+        scum_log_parse, files of a group ordered by their timestamp suffix.
+        Groups that were never read before are left to scum_log_parse.
+        backfill_complete is only True after every file was read or
+        skipped as unreadable.
+        """
+        self.backfill_complete = False
+        if not await self._retrieve_files(backfill=True):
+            return
+        for base_name, files in self.backfill_groups.items():
+            files.sort()
+            self.logging.info(f"Backfill {len(files)} file(s) for {base_name}")
+            for _, path, file_mtime, file_size in files:
+                try:
+                    _, content = await self._retrive_group_content(base_name, path,
+                                                                   file_mtime, file_size)
+                except self.FILE_ERRORS as e:
+                    # reading it again won't help, the backfill has to finish
+                    self.logging.warning(f"Backfill skips {path}: {str(e)}")
+                    continue
+                except self.SOURCE_ERRORS as e:
+                    # stop here, the caller runs the backfill again from the
+                    # checkpoints before reading the newest files
+                    await self._report_failure(e)
+                    return
+                if content:
+                    yield {path: [content, self.sent_entries]}
+        self.backfill_complete = True
+
+    def shutdown(self) -> None:
+        """release the client, called when the bot exits"""
+        self.client.shutdown()
+
+    async def scum_log_parse(self) -> str:
+        """parse log"""
+        if not await self._retrieve_files():
+            return {}
+        return await self._retrive_file_content()
+
+    def _debug_to_stdout(self, msg):
+        self.logging.debug(msg)
@@ -0,0 +1,154 @@
+"""
+    @Author: Thorsten liepert <thorsten@liepert.dev>
+    @Date: 18.10.2026
+    @CLicense: MIT
+    @Description: Asyncio wrapper running the blocking paramiko SFTP calls in a thread pool
+"""
+import asyncio
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+import paramiko.ssh_exception
+
+from modules.logsource import LogClient
+
+# Errors that mean the server is unreachable or the connection broke
+CONNECTION_ERRORS = (paramiko.ssh_exception.SSHException, EOFError, OSError, socket.timeout)
+# Errors of a single file, e.g. rotated away or not readable, the session is fine
+FILE_READ_ERRORS = (FileNotFoundError, PermissionError, paramiko.SFTPError)
+
+class AsyncSFTPClient(LogClient):
+    """SFTP client whose blocking calls are awaited from a bounded thread pool"""
+    sftp_server = ""
+    sftp_user = ""
+    sftp_password = ""
+    sftp_port = 22
+    connect_p: paramiko.SSHClient = None
+    connect_sftp_p: paramiko.SFTPClient = None
+    max_channels: int = 4
+    connect_timeout: float = 10.0
+    io_timeout: float = 60.0
+
+    _executor: ThreadPoolExecutor
+    _channels: list
+    _channel_slots: asyncio.Semaphore
+
+    def __init__(self, server, port, user, passwd, max_workers: int = 4,
+                 max_channels: int = 4, connect_timeout: float = 10.0,
+                 io_timeout: float = 60.0) -> None:
+        self.sftp_server = server
+        self.sftp_user = user
+        self.sftp_password = passwd
+        self.sftp_port = port
+        self.connect_timeout = connect_timeout
+        self.io_timeout = io_timeout
+        self.max_channels = max(1, max_channels)
+        # Every channel needs its own thread to transfer in parallel
+        self._executor = ThreadPoolExecutor(max_workers=max(max_workers, self.max_channels),
+                                            thread_name_prefix="sftp")
+        self._channels = []
+        self._channel_slots = asyncio.Semaphore(self.max_channels)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> None:
+        self._close()
+        self.connect_p = paramiko.SSHClient()
+        self.connect_p.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.connect_p.connect(hostname=self.sftp_server, port=self.sftp_port,
+                               username=self.sftp_user, password=self.sftp_password,
+                               allow_agent=False,look_for_keys=False,
+                               timeout=self.connect_timeout,
+                               banner_timeout=self.connect_timeout,
+                               auth_timeout=self.connect_timeout,
+                               channel_timeout=self.connect_timeout)
+        self.connect_sftp_p = self._open_channel()
+
+    def _open_channel(self) -> paramiko.SFTPClient:
+        channel = self.connect_p.open_sftp()
+        # a stalled transfer raises socket.timeout instead of hanging forever
+        channel.get_channel().settimeout(self.io_timeout)
+        return channel
+
+    def _read(self, channel: paramiko.SFTPClient, path: str, offset: int, length: int) -> bytes:
+        with channel.open(path) as file:
+            if offset > 0:
+                file.seek(offset)
+            if length is None:
+                return file.read()
+            return file.read(length)
+
+    def _close(self) -> None:
+        for channel in self._channels:
+            channel.close()
+        self._channels = []
+        if self.connect_sftp_p is not None:
+            self.connect_sftp_p.close()
+        if self.connect_p is not None:
+            self.connect_p.close()
+        self.connect_sftp_p = None
+        self.connect_p = None
+
+    def is_connected(self) -> bool:
+        """return True if a SFTP session was opened"""
+        return self.connect_sftp_p is not None
+
+    def is_alive(self) -> bool:
+        """return True if the ssh transport is still usable"""
+        transport = self.get_transport()
+        return transport is not None and transport.is_alive() and transport.is_active()
+
+    def set_keepalive(self, interval: int) -> None:
+        """send keepalive packets every interval seconds"""
+        transport = self.get_transport()
+        if transport is not None:
+            transport.set_keepalive(interval)
+
+    def get_transport(self) -> paramiko.Transport:
+        """return the transport of the underlying ssh connection"""
+        if self.connect_p is None:
+            return None
+        return self.connect_p.get_transport()
+
+    async def connect(self) -> None:
+        """open ssh connection and sftp session"""
+        await self._run(self._connect)
+
+    async def listdir_attr(self, path: str) -> list:
+        """list directory with file attributes"""
+        return await self._run(self.connect_sftp_p.listdir_attr, path)
+
+    async def read(self, path: str, offset: int = 0, length: int = None) -> bytes:
+        """read length bytes starting at offset, the whole file if length is None
+
+        Reads use their own SFTP channels on the shared ssh transport, so up to
+        max_channels reads can transfer at the same time.
+        """
+        async with self._channel_slots:
+            if self._channels:
+                channel = self._channels.pop()
+            else:
+                channel = await self._run(self._open_channel)
+            try:
+                content = await self._run(self._read, channel, path, offset, length)
+            except FILE_READ_ERRORS:
+                # only the file failed, the channel can be used again
+                self._channels.append(channel)
+                raise
+            except Exception:
+                channel.close()
+                raise
+            self._channels.append(channel)
+        return content
+
+    async def close(self) -> None:
+        """close sftp session and ssh connection"""
+        await self._run(self._close)
+
+    def shutdown(self) -> None:
+        """close connection and stop the thread pool"""
+        self._close()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,27 @@
+"""
+    @Author: Thorsten liepert <thorsten@liepert.dev>
+    @Date: 18.10.2026
+    @CLicense: MIT
+    @Description: Convert the timestamps of SCUM log lines to epoch seconds
+"""
+from datetime import datetime
+from functools import lru_cache
+
+LOG_TIMESTAMP_FORMAT = "%Y.%m.%d-%H.%M.%S"
+
+@lru_cache(maxsize=1024)
+def _hour_epoch(prefix: str) -> float:
+    """epoch of the full hour YYYY.MM.DD-HH in local time"""
+    return datetime(int(prefix[0:4]), int(prefix[5:7]), int(prefix[8:10]),
+                    int(prefix[11:13])).timestamp()
+
+def log_timestamp_to_epoch(string: str) -> float:
+    """return the epoch of a YYYY.MM.DD-HH.MM.SS log timestamp
+
+    The fields are sliced out of the fixed width string, the expensive
+    conversion to epoch is only done once per hour and then cached.
+    """
+    if len(string) != 19 or string[10] != "-" or string[13] != "." or string[16] != ".":
+        # not the fixed width format, let strptime parse or reject it
+        return datetime.strptime(string, LOG_TIMESTAMP_FORMAT).timestamp()
+    return _hour_epoch(string[:13]) + int(string[14:16]) * 60 + int(string[17:19])